@@ -1,10 +1,28 @@
-import usocket as socket
+try:
+    import usocket as socket
+except ImportError:
+    import socket
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
 import gc, json
+from binascii import crc32
+from group4tickets import TicketRing
+from group4slots import SlotTable
 from time import sleep_ms, time, localtime
 
 # Initialize the slots and closed tickets data
-slots = {}
-closed_tickets = []
+# (group4main replaces both with its own SlotTable / TicketRing)
+slots = SlotTable(0)
+closed_tickets = TicketRing(1)
+
+# Bumped by group4main after every change to slots / closed_tickets.
+# The boot tag keeps ETags from a previous run from matching after a reset.
+state_version = 0
+_BOOT_TAG = "{:x}".format(int(time()) & 0xFFFFFF)
+_slot_versions = {}  # slot -> state_version of its last change
+_ticket_versions = []  # (ticket, state_version) of the newest closed tickets, oldest first
 
 # Helper function to format time
 def format_time(ts):
@@ -17,13 +35,40 @@ def format_time(ts):
 # Function to summarize the slots and their statuses
 def summarize():
     total = len(slots)
-    occ = sum(1 for s in slots.values() if s.get("occupied"))
-    free = total - occ
+    occ = slots.occupied_count()
+    free = slots.free_count()
     return {"total": total, "occupied": occ, "free": free}
 
-# Function to broadcast events to the dashboard (e.g., car entry/exit)
-def broadcast_event(msg):
+# Mark the dashboard state as changed (invalidates the /data ETag).
+# The changed slot and/or newly closed ticket are recorded with the new
+# version so /data?since=N can return just what changed after N. The
+# version is kept beside the ticket, not in it, so it never reaches the JSON.
+def bump_version(slot=None, ticket=None):
+    global state_version
+    state_version += 1
+    if slot is not None:
+        _slot_versions[slot] = state_version
+    if ticket is not None:
+        _ticket_versions.append((ticket, state_version))
+        if len(_ticket_versions) > TICKETS_MAX_LIMIT:
+            del _ticket_versions[0]  # a delta never carries more than this
+
+# Function to broadcast events to the dashboard (e.g., car entry/exit).
+# With a slot number the new slot state is pushed to /events subscribers;
+# called from the sensors thread, the server task does the actual sending.
+def broadcast_event(msg, slot=None):
     print("[WEB EVENT]", msg)
+    if slot is None or not _subscribers:
+        return
+    if len(_pending_events) >= MAX_PENDING_EVENTS:
+        _pending_events.pop(0)
+    _pending_events.append(json.dumps({
+        "slot": slot,
+        "state": slots.get(slot),
+        "summary": summarize(),
+        "msg": msg,
+    }))
+    _event_flag.set()
 
 # Get the current time in `hh:mm:ss` format
 def get_current_time():
@@ -145,55 +190,455 @@ tr:hover {
 <script>
 function fmt(t){ return new Date(t*1000).toLocaleTimeString(); }
 
-function update() {
-    fetch('/data').then(r => r.json()).then(d => {
-        const s = d.summary;
-        document.getElementById('status').innerHTML = 'Total ' + s.total + ' • Free ' + s.free + ' • Occupied ' + s.occupied;
-
-        // Display current time
-        document.getElementById('current-time').innerHTML = 'Current Time: ' + new Date().toLocaleTimeString();
-        
-        const slotsDiv = document.getElementById('slots');
-        slotsDiv.innerHTML = '';
-        for (const key in d.slots) {
-            let i = d.slots[key];
-            const div = document.createElement('div');
-            div.className = 'slot ' + (i.occupied ? 'occupied' : 'free');
-            div.innerHTML = '<strong>S' + key + '</strong><br>' + (i.occupied ? ('ID: ' + i.id) : 'Free Slot');
-            slotsDiv.appendChild(div);
-        }
+let state = null;
 
-        const act = document.getElementById('active');
-        act.innerHTML = '<tr><th>ID</th><th>Slot</th><th>Time-In</th><th>Time-Out</th></tr>';
-        for (const k in d.slots) {
-            const i = d.slots[k];
-            if (i.occupied) {
-                const tr = document.createElement('tr');
-                // Add current time for Time-In and Time-Out in active tickets
-                tr.innerHTML = '<td>' + i.id + '</td><td>S' + k + '</td><td>' + fmt(new Date().getTime()/1000) + '</td><td>' + fmt(new Date().getTime()/1000) + '</td>';
-                act.appendChild(tr);
-            }
-        }
+function renderSlots(d) {
+    const s = d.summary;
+    document.getElementById('status').innerHTML = 'Total ' + s.total + ' • Free ' + s.free + ' • Occupied ' + s.occupied;
 
-        const clos = document.getElementById('closed');
-        clos.innerHTML = '<tr><th>ID</th><th>Slot</th><th>Duration</th><th>Fee</th><th>Time-Out</th></tr>';
-        for (const t of d.closed_tickets) {
+    // Display current time
+    document.getElementById('current-time').innerHTML = 'Current Time: ' + new Date().toLocaleTimeString();
+
+    const slotsDiv = document.getElementById('slots');
+    slotsDiv.innerHTML = '';
+    for (const key in d.slots) {
+        let i = d.slots[key];
+        const div = document.createElement('div');
+        div.className = 'slot ' + (i.occupied ? 'occupied' : 'free');
+        div.innerHTML = '<strong>S' + key + '</strong><br>' + (i.occupied ? ('ID: ' + i.id) : 'Free Slot');
+        slotsDiv.appendChild(div);
+    }
+
+    const act = document.getElementById('active');
+    act.innerHTML = '<tr><th>ID</th><th>Slot</th><th>Time-In</th><th>Time-Out</th></tr>';
+    for (const k in d.slots) {
+        const i = d.slots[k];
+        if (i.occupied) {
             const tr = document.createElement('tr');
-            tr.innerHTML = '<td>' + t.id + '</td><td>S' + t.slot + '</td><td>' + t.duration + '</td><td>$' + t.fee.toFixed(2) + '</td><td>' + t.time_out + '</td>';
-            clos.appendChild(tr);
+            // Add current time for Time-In and Time-Out in active tickets
+            tr.innerHTML = '<td>' + i.id + '</td><td>S' + k + '</td><td>' + fmt(new Date().getTime()/1000) + '</td><td>' + fmt(new Date().getTime()/1000) + '</td>';
+            act.appendChild(tr);
+        }
+    }
+}
+
+// Only the newest page of closed tickets is ever held by the page.
+const PAGE = 10;
+let closed = [];
+
+function renderClosed() {
+    const clos = document.getElementById('closed');
+    clos.innerHTML = '<tr><th>ID</th><th>Slot</th><th>Duration</th><th>Fee</th><th>Time-Out</th></tr>';
+    for (const t of closed) {
+        const tr = document.createElement('tr');
+        tr.innerHTML = '<td>' + t.id + '</td><td>S' + t.slot + '</td><td>' + t.duration + '</td><td>$' + t.fee.toFixed(2) + '</td><td>' + t.time_out + '</td>';
+        clos.appendChild(tr);
+    }
+}
+
+function loadTickets() {
+    fetch('/tickets?offset=0&limit=' + PAGE).then(r => r.json()).then(p => {
+        closed = p.tickets;
+        renderClosed();
+    }).catch(e => console.error('tickets', e));
+}
+
+// After the first full load only the changes since state.version are
+// fetched and merged in.
+function update() {
+    const url = state ? '/data?since=' + state.version + '&boot=' + state.boot : '/data';
+    fetch(url).then(r => r.json()).then(d => {
+        if (d.full || !state) {
+            state = d;
+            loadTickets();
+        } else {
+            for (const k in d.slots) state.slots[k] = d.slots[k];
+            if (d.closed_tickets.length) {
+                closed = d.closed_tickets.reverse().concat(closed).slice(0, PAGE);
+                renderClosed();
+            }
+            state.summary = d.summary;
+            state.version = d.version;
         }
+        renderSlots(state);
     }).catch(e => console.error('update', e));
 }
 
+// Slot changes are pushed over /events; polling is only a slow safety net
+// while the stream is up, and the old 4 s rate when it is not available.
+let poll = setInterval(update, 4000);
+function setPoll(ms) { clearInterval(poll); poll = setInterval(update, ms); }
+
+if (window.EventSource) {
+    const es = new EventSource('/events');
+    es.onopen = () => { setPoll(30000); update(); };
+    es.onerror = () => setPoll(4000);
+    es.addEventListener('slot', e => {
+        const m = JSON.parse(e.data);
+        if (!state) return update();
+        state.slots[m.slot] = m.state;
+        state.summary = m.summary;
+        renderSlots(state);
+        if (!m.state.occupied) update();  // an exit also closed a ticket
+    });
+}
+
 update();
-setInterval(update, 4000);
 </script>
 </body>
 </html>
 """
 
 # ------------------ Server ------------------
+# "async" serves many clients at once on uasyncio; "blocking" is the original
+# one-client-at-a-time accept() loop, kept for comparison and as a fallback.
+SERVER_MODE = "async"
+MAX_CLIENTS = 6          # connections handled at once, extra ones get a 503
+BACKLOG = 5
+READ_TIMEOUT_S = 5       # per request, covers the request line and headers
+WRITE_TIMEOUT_S = 5      # per drain() of the response
+MAX_HEADERS = 32
+TICKETS_PAGE = 10        # default /tickets?limit=
+TICKETS_MAX_LIMIT = 25
+STREAM_CHUNK = 256       # JSON responses are written in pieces of this size
+
+_active_clients = 0
+
+# ------------------ Server-Sent Events ------------------
+MAX_SUBSCRIBERS = 3      # long-lived /events streams, on top of MAX_CLIENTS
+MAX_PENDING_EVENTS = 8
+HEARTBEAT_S = 15
+SSE_WRITE_TIMEOUT_S = 2  # a subscriber slower than this is dropped
+
+_subscribers = []
+_pending_events = []
+
+_HDR_SSE = (b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+            b"Connection: keep-alive\r\n\r\nretry: 3000\n\n")
+_SSE_PING = b": ping\n\n"
+
+
+class _PollFlag:
+    """Stand-in for asyncio.ThreadSafeFlag where the port lacks it."""
+    def __init__(self):
+        self._set = False
+
+    def set(self):
+        self._set = True
+
+    async def wait(self):
+        while not self._set:
+            await asyncio.sleep(0.05)
+        self._set = False
+
+
+# broadcast_event() runs on the sensors thread, so the wake-up has to be
+# thread safe; ThreadSafeFlag is MicroPython's primitive for that.
+_event_flag = asyncio.ThreadSafeFlag() if hasattr(asyncio, "ThreadSafeFlag") else _PollFlag()
+
+
+async def _sse_pump():
+    while True:
+        try:
+            await asyncio.wait_for(_event_flag.wait(), HEARTBEAT_S)
+        except asyncio.TimeoutError:
+            pass
+        if _pending_events:
+            chunk = "".join("event: slot\ndata: {}\n\n".format(_pending_events.pop(0))
+                            for _ in range(len(_pending_events))).encode()
+        else:
+            chunk = _SSE_PING
+        for w in list(_subscribers):
+            try:
+                w.write(chunk)
+                await asyncio.wait_for(w.drain(), SSE_WRITE_TIMEOUT_S)
+            except Exception:
+                _subscribers.remove(w)
+                await _close(w)
+
+PAGE_CACHE = "max-age=300"   # page only changes with a firmware update
+DATA_CACHE = "no-cache"      # always revalidate, usually answered with a 304
+
+_HDR_JSON = b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nConnection: close\r\n\r\n"
+_HDR_HTML = b"HTTP/1.1 200 OK\r\nContent-Type: text/html\r\nConnection: close\r\n\r\n"
+_HDR_BUSY = b"HTTP/1.1 503 Service Unavailable\r\nRetry-After: 1\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+_HTML_BYTES = _HTML.encode()
+_PAGE_ETAG = '"p{:08x}"'.format(crc32(_HTML_BYTES) & 0xFFFFFFFF)
+_HDR_PAGE = ("HTTP/1.1 200 OK\r\nContent-Type: text/html\r\nContent-Length: {}\r\n"
+             "ETag: {}\r\nCache-Control: {}\r\nConnection: close\r\n\r\n").format(
+                 len(_HTML_BYTES), _PAGE_ETAG, PAGE_CACHE).encode()
+_HDR_PAGE_304 = ("HTTP/1.1 304 Not Modified\r\nETag: {}\r\nCache-Control: {}\r\n"
+                 "Connection: close\r\n\r\n").format(_PAGE_ETAG, PAGE_CACHE).encode()
+
+
+def _data_etag(version):
+    return '"v{}-{}"'.format(_BOOT_TAG, version)
+
+
+def _etag_matches(headers, etag):
+    inm = headers.get("if-none-match")
+    if not inm:
+        return False
+    if inm == "*":
+        return True
+    for tag in inm.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
+def _data_head(status, etag):
+    if status == 304:
+        return ("HTTP/1.1 304 Not Modified\r\nETag: {}\r\nCache-Control: {}\r\n"
+                "Connection: close\r\n\r\n").format(etag, DATA_CACHE).encode()
+    return ("HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nETag: {}\r\n"
+            "Cache-Control: {}\r\nConnection: close\r\n\r\n").format(etag, DATA_CACHE).encode()
+
+
+def _data_doc(version, since=None):
+    """Full state, or only what changed after `since` when it is usable.
+
+    Closed tickets are never sent in full, the page reads them from
+    /tickets; a delta carries at most one page of newly closed ones.
+    """
+    if since is None or since > version:
+        return {
+            "version": version,
+            "boot": _BOOT_TAG,
+            "full": True,
+            "slots": slots,
+            "tickets": closed_tickets.total,
+            "summary": summarize()
+        }
+    changed = {}
+    for i, v in list(_slot_versions.items()):
+        if v > since:
+            changed[i] = slots[i]
+    new = []
+    for t, v in reversed(_ticket_versions[:]):
+        if v <= since:
+            break
+        new.append(t)
+    new.reverse()
+    return {
+        "version": version,
+        "boot": _BOOT_TAG,
+        "full": False,
+        "slots": changed,
+        "closed_tickets": new,
+        "summary": summarize()
+    }
+
+
+def _tickets_doc(query):
+    offset = max(0, _int_arg(query, "offset", 0))
+    limit = min(max(1, _int_arg(query, "limit", TICKETS_PAGE)), TICKETS_MAX_LIMIT)
+    return {
+        "total": closed_tickets.total,
+        "kept": len(closed_tickets),
+        "offset": offset,
+        "limit": limit,
+        "tickets": closed_tickets.page(offset, limit)
+    }
+
+
+class _JsonStream:
+    """JSON encoder that writes to a stream through one reused buffer.
+
+    Only scalars are converted on their own, containers are walked and
+    emitted piece by piece, so peak RAM per response is the buffer plus
+    the largest single value instead of two copies of the whole document.
+    """
+    def __init__(self, writer, size=STREAM_CHUNK):
+        self.writer = writer
+        self.buf = bytearray(size)
+        self.mv = memoryview(self.buf)
+        self.n = 0
+
+    async def flush(self):
+        if self.n:
+            self.writer.write(self.mv[:self.n])
+            await asyncio.wait_for(self.writer.drain(), WRITE_TIMEOUT_S)
+            self.n = 0
+
+    async def put(self, b):
+        size = len(self.buf)
+        pos = 0
+        while pos < len(b):
+            if self.n == size:
+                await self.flush()
+            k = min(size - self.n, len(b) - pos)
+            self.mv[self.n:self.n + k] = b[pos:pos + k]
+            self.n += k
+            pos += k
+
+    async def value(self, obj):
+        if isinstance(obj, dict) or hasattr(obj, "items"):  # dict or SlotTable
+            await self.put(b"{")
+            first = True
+            for k, v in obj.items():
+                if not first:
+                    await self.put(b", ")
+                first = False
+                await self.put(json.dumps(str(k)).encode())
+                await self.put(b": ")
+                await self.value(v)
+            await self.put(b"}")
+        elif isinstance(obj, (list, tuple)):
+            await self.put(b"[")
+            for i, v in enumerate(obj):
+                if i:
+                    await self.put(b", ")
+                await self.value(v)
+            await self.put(b"]")
+        else:
+            await self.put(json.dumps(obj).encode())
+
+
+async def _send_json(writer, head, doc):
+    await _send(writer, head)
+    out = _JsonStream(writer)
+    await out.value(doc)
+    await out.flush()
+
+
+def _parse_path(path):
+    """Split "/x?a=1&b=2" into ("/x", {"a": "1", "b": "2"})."""
+    path, _, qs = path.partition("?")
+    query = {}
+    if qs:
+        for pair in qs.split("&"):
+            k, _, v = pair.partition("=")
+            if k:
+                query[k] = v
+    return path, query
+
+
+def _int_arg(query, name, default=None):
+    try:
+        return int(query[name])
+    except (KeyError, ValueError):
+        return default
+
+
+def _since_arg(query):
+    # A version from another boot means nothing here, send everything.
+    if query.get("boot") != _BOOT_TAG:
+        return None
+    return _int_arg(query, "since")
+
+
+async def _read_request(reader):
+    """Read the request line and headers; returns (method, path, headers)."""
+    line = await reader.readline()
+    if not line:
+        return None, None, None
+    parts = line.decode().split()
+    if len(parts) < 2:
+        return None, None, None
+    headers = {}
+    for _ in range(MAX_HEADERS):
+        h = await reader.readline()
+        if not h or h == b"\r\n" or h == b"\n":
+            break
+        k, sep, v = h.decode().partition(":")
+        if sep:
+            headers[k.strip().lower()] = v.strip()
+    return parts[0], parts[1], headers
+
+
+async def _send(writer, *chunks):
+    for c in chunks:
+        writer.write(c)
+        await asyncio.wait_for(writer.drain(), WRITE_TIMEOUT_S)
+
+
+async def _handle_client(reader, writer):
+    global _active_clients
+    if _active_clients >= MAX_CLIENTS:
+        try:
+            await _send(writer, _HDR_BUSY)
+        except Exception:
+            pass
+        await _close(writer)
+        return
+    _active_clients += 1
+    keep_open = False
+    try:
+        method, path, headers = await asyncio.wait_for(_read_request(reader), READ_TIMEOUT_S)
+        if method is None:
+            return
+        path, query = _parse_path(path)
+        if path.startswith("/events"):
+            if len(_subscribers) >= MAX_SUBSCRIBERS:
+                await _send(writer, _HDR_BUSY)
+            else:
+                await _send(writer, _HDR_SSE)
+                _subscribers.append(writer)
+                keep_open = True  # owned by _sse_pump from here on
+        elif path == "/tickets":
+            # Tickets only change together with state_version, so the
+            # /data tag is valid here too (the URL keys the browser cache).
+            etag = _data_etag(state_version)
+            if _etag_matches(headers, etag):
+                await _send(writer, _data_head(304, etag))
+            else:
+                await _send_json(writer, _data_head(200, etag), _tickets_doc(query))
+        elif path.startswith("/data"):
+            # Take the version once, before serializing: the tag and the body
+            # both use it, so a concurrent change can only make the body newer
+            # than its tag, never older.
+            version = state_version
+            etag = _data_etag(version)
+            if _etag_matches(headers, etag):
+                await _send(writer, _data_head(304, etag))
+            else:
+                await _send_json(writer, _data_head(200, etag), _data_doc(version, _since_arg(query)))
+        elif _etag_matches(headers, _PAGE_ETAG):
+            await _send(writer, _HDR_PAGE_304)
+        else:
+            await _send(writer, _HDR_PAGE, _HTML_BYTES)
+    except Exception as e:
+        print("⚠️ Client error:", e)
+    finally:
+        _active_clients -= 1
+        if not keep_open:
+            await _close(writer)
+        gc.collect()
+
+
+async def _close(writer):
+    try:
+        writer.close()
+        await writer.wait_closed()
+    except Exception:
+        pass
+
+
+async def _serve(host, port):
+    server = await asyncio.start_server(_handle_client, host, port, backlog=BACKLOG)
+    asyncio.create_task(_sse_pump())
+    print("🌐 Web Dashboard ready at http://{}:{} (async, {} clients)".format(host, port, MAX_CLIENTS))
+    try:
+        while True:
+            await asyncio.sleep(3600)
+    finally:
+        server.close()
+
+
 def start_server(host="0.0.0.0", port=8080):
+    """Run the dashboard forever; raises if the port cannot be bound."""
+    gc.collect()
+    if SERVER_MODE == "blocking":
+        return start_server_blocking(host, port)
+    asyncio.new_event_loop()
+    asyncio.run(_serve(host, port))
+
+
+def start_server_blocking(host="0.0.0.0", port=8080):
     gc.collect()
     s = socket.socket()
     s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
@@ -208,19 +653,20 @@ def start_server(host="0.0.0.0", port=8080):
             if not req:
                 conn.close()
                 continue
-            reqs = req.decode()
-
-            if reqs.startswith("GET /data"):
-                payload = json.dumps({
-                    "slots": slots,
-                    "closed_tickets": closed_tickets,
-                    "summary": summarize()
-                })
-                conn.send(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nConnection: close\r\n\r\n")
-                conn.send(payload.encode())
+            parts = req.decode().split(" ", 2)
+            path, query = _parse_path(parts[1] if len(parts) > 1 else "/")
+
+            if path == "/tickets":
+                conn.send(_HDR_JSON)
+                conn.send(json.dumps(_tickets_doc(query)).encode())
+            elif path.startswith("/data"):
+                doc = _data_doc(state_version)
+                doc["slots"] = dict(slots.items())
+                conn.send(_HDR_JSON)
+                conn.send(json.dumps(doc).encode())
             else:
-                conn.send(b"HTTP/1.1 200 OK\r\nContent-Type: text/html\r\nConnection: close\r\n\r\n")
-                conn.send(_HTML.encode())
+                conn.send(_HDR_HTML)
+                conn.send(_HTML_BYTES)
 
         except Exception as e:
             print("⚠️ Client error:", e)
@@ -228,4 +674,3 @@ def start_server(host="0.0.0.0", port=8080):
             try: conn.close()
             except: pass
             gc.collect()
-
@@ -0,0 +1,108 @@
+# group4ir_expander.py — IR slot sensors behind MCP23017 / PCF8575 I2C expanders
+# Each 16-bit expander carries 16 IR sensors and is read with a single I2C
+# transfer. scan() compares the ports with the previous reading and only
+# reports the slots whose sensor changed. Slot numbering: expander k, bit b
+# (port A / P0x first) is slot 16 * k + b + 1. SlotWatcher turns those
+# changes into car in / car out, with the exit grace period.
+from group4slots import NO_TIME
+try:
+    from time import ticks_diff
+except ImportError:  # CPython, for the host tests
+    def ticks_diff(a, b):
+        return a - b
+
+MCP23017 = "mcp23017"
+PCF8575 = "pcf8575"
+
+_MCP_IODIRA = 0x00   # IODIRA/IODIRB are adjacent (IOCON.BANK = 0, the reset default)
+_MCP_GPPUA = 0x0C
+_MCP_GPIOA = 0x12
+
+
+class ExpanderSlotSensors:
+    def __init__(self, i2c, addrs, chip=MCP23017, num_slots=None, active_low=True):
+        self.i2c = i2c
+        self.addrs = tuple(addrs)
+        self.chip = chip
+        self.num_slots = num_slots or 16 * len(self.addrs)
+        n = 2 * len(self.addrs)
+        # Level an empty slot reads: the IR modules pull LOW when a car is seen
+        self._idle = 0xFF if active_low else 0x00
+        self._cur = bytearray(n)
+        self._prev = bytearray([self._idle] * n)  # start as "all empty"
+        mv = memoryview(self._cur)
+        self._views = [mv[2 * k:2 * k + 2] for k in range(len(self.addrs))]
+        self._setup()
+
+    def _setup(self):
+        for a in self.addrs:
+            if self.chip == MCP23017:
+                self.i2c.writeto_mem(a, _MCP_IODIRA, b"\xff\xff")  # all pins inputs
+                self.i2c.writeto_mem(a, _MCP_GPPUA, b"\xff\xff")   # with pull-ups
+            else:
+                self.i2c.writeto(a, b"\xff\xff")  # PCF8575: pins released high act as inputs
+
+    def scan(self, on_change):
+        """Read all expanders and call on_change(slot, car) for changed slots only.
+
+        Returns the number of changed slots. Allocation free when nothing
+        changed: the ports are read into a preallocated buffer.
+        """
+        for k in range(len(self.addrs)):
+            if self.chip == MCP23017:
+                self.i2c.readfrom_mem_into(self.addrs[k], _MCP_GPIOA, self._views[k])
+            else:
+                self.i2c.readfrom_into(self.addrs[k], self._views[k])
+        cur, prev = self._cur, self._prev
+        changed = 0
+        for j in range(len(cur)):
+            x = cur[j] ^ prev[j]
+            if not x:
+                continue
+            prev[j] = cur[j]
+            for b in range(8):
+                if x & (1 << b):
+                    slot = j * 8 + b + 1
+                    if slot <= self.num_slots:
+                        on_change(slot, ((cur[j] ^ self._idle) >> b) & 1 == 1)
+                        changed += 1
+        return changed
+
+
+
+class SlotWatcher:
+    """Slot logic on top of scan(): on_enter(slot) when a car appears in a
+    free slot, on_exit(slot) once an occupied slot has read clear for
+    grace_ms. A car seen again within the grace period cancels the exit,
+    so a sensor glitch does not close the ticket.
+
+    Set .now (ticks_ms) before each scan(watcher.change), then call expire().
+    """
+
+    def __init__(self, slots, grace_ms, on_enter, on_exit):
+        self.slots = slots
+        self.grace_ms = grace_ms
+        self.on_enter = on_enter
+        self.on_exit = on_exit
+        self.now = 0
+        self._leaving = []  # slots counting down their grace period
+
+    def change(self, slot, car):
+        slots = self.slots
+        if car:
+            if slot in self._leaving:
+                self._leaving.remove(slot)  # back within the grace period
+                slots.set_free_since(slot, NO_TIME)
+            elif not slots.is_occupied(slot):
+                self.on_enter(slot)
+        elif slots.is_occupied(slot):
+            slots.set_free_since(slot, self.now)
+            self._leaving.append(slot)
+
+    def expire(self):
+        if not self._leaving:
+            return
+        for slot in self._leaving[:]:
+            if ticks_diff(self.now, self.slots.free_since(slot)) >= self.grace_ms:  # Grace period to confirm exit
+                self._leaving.remove(slot)
+                self.on_exit(slot)
@@ -3,43 +3,75 @@
 # Hardened against OSError:23 socket bind errors
 # ==========================================================
 import machine
+import micropython
 import sys
 import gc
-from machine import Pin, PWM, SoftI2C, time_pulse_us, reset
-from time import sleep, sleep_us, time, localtime, ticks_ms, ticks_diff
+from machine import Pin, PWM, SoftI2C, Timer, reset
+from time import sleep, sleep_ms, time, localtime, ticks_ms, ticks_us, ticks_diff, ticks_add
 import network, _thread
 import group4telegram_bot as telegram_bot
 import group4secrets as secrets
 import group4i2c_lcd as lcd_driver
+from lcd_api import LcdFrame
 import Web_DashboardGroup4 as web_dashboard
+from group4slots import SlotTable, NO_TIME
+from group4hcsr04 import HCSR04
+from group4tickets import TicketRing
+from group4ticketids import TicketIds
+from group4ir_expander import ExpanderSlotSensors, SlotWatcher
 import usocket as socket  # low-level socket for cleanup
 
 # ---------------- CONFIG ----------------
-IR_PINS = (32, 33, 34)
+IR_BACKEND = "gpio"      # "gpio": one pin per slot, "expander": IR sensors on I2C expanders
+IR_PINS = (32, 33, 34)   # gpio backend: slot n is watched by IR_PINS[n - 1]
+EXPANDER_CHIP = "mcp23017"  # or "pcf8575"
+EXPANDER_ADDRS = (0x20,)    # 16 slots per expander, on the LCD's I2C bus
+EXPANDER_SLOTS = 16         # sensors actually wired, <= 16 * len(EXPANDER_ADDRS)
+NUM_SLOTS = len(IR_PINS) if IR_BACKEND == "gpio" else EXPANDER_SLOTS
 TRIG_PIN, ECHO_PIN = 27, 26
 SERVO_PIN = 16
 I2C_SDA, I2C_SCL = 21, 22
 LCD_ADDR, LCD_W, LCD_H = 0x27, 16, 2
 
 ENTRY_DISTANCE_CM = 15
+SONAR_WINDOW = 3         # readings in the ultrasonic median filter
+SONAR_IDLE_MS = 500      # ping interval while nothing is near the gate
+SONAR_BURST_MS = 40      # ping interval while something approaches (> 38 ms max echo)
+APPROACH_CM = 80         # anything closer than this, or closing in, starts a burst
+APPROACH_STEP_CM = 5     # drop between pings that counts as closing in
+BURST_HOLD_MS = 2000     # stay at the burst rate this long after the last approach
+GATE_CONFIRM_MS = 120    # car seen this long within ENTRY_DISTANCE_CM -> open
+GATE_CLEAR_MS = 1000     # nothing seen this long -> close
 FEE_PER_MIN = 0.5
 SERVO_CLOSE_US, SERVO_OPEN_US = 1100, 1900
 LCD_REFRESH_MS, EXIT_GRACE_MS = 500, 1000
+LCD_EVENT_HOLD_MS = 1500  # a car in/out message stays up this long before the status screen
+IR_MODE = "irq"          # "irq": pin edge interrupts, "poll": read every loop pass
+IR_DEBOUNCE_MS = 50
+IR_TIMER_ID = 0          # hardware timer used for debounce / grace expiry
+LOOP_PERIOD_MS = 100
+GC_EVERY_PASS = False    # True restores the old gc.collect() on every loop pass
+GC_FREE_THRESHOLD = 24 * 1024  # otherwise collect only when free heap drops below this
+CLOSED_TICKETS_CAP = 50  # older closed tickets are dropped from RAM
+TICKET_ID_BLOCK = 32     # ticket numbers reserved per flash write
 
 # ---------------- STATE ----------------
-slots = {3: {"occupied": False, "id": None, "time_in": None, "time_out": None, "free_since": None}, 
-         1: {"occupied": False, "id": None, "time_in": None, "time_out": None, "free_since": None}, 
-         2: {"occupied": False, "id": None, "time_in": None, "time_out": None, "free_since": None}}
+slots = SlotTable(NUM_SLOTS)
 
-closed_tickets = []
-_available_ids = set(range(1, 4))
+closed_tickets = TicketRing(CLOSED_TICKETS_CAP)
+ticket_ids = TicketIds(block=TICKET_ID_BLOCK)  # unique across reboots, never recycled
 web_dashboard.slots = slots
 web_dashboard.closed_tickets = closed_tickets
 
 # ---------------- HW globals ----------------
+_i2c = None
+_i2c_lock = _thread.allocate_lock()  # LCD writer and expander scan share the bus
 _lcd = None
+_frame = None           # shadow framebuffer: only changed characters go to the LCD
 _lcd_enabled = False
 _last_lcd_update = 0
+_lcd_version = -1       # slots.version lcd_update last drew, to skip unchanged frames
+_lcd_gate = None
 servo = None
 _gate_open = False
 
@@ -71,16 +103,24 @@ def reset_wifi_interface():
     gc.collect()
 
 # ---------------- LCD ----------------
+def i2c_bus():
+    """The I2C bus shared by the LCD and the slot expanders."""
+    global _i2c
+    if _i2c is None:
+        _i2c = SoftI2C(sda=Pin(I2C_SDA), scl=Pin(I2C_SCL))
+    return _i2c
+
 def _lcd_init():
-    global _lcd, _lcd_enabled
+    global _lcd, _frame, _lcd_enabled
     try:
-        i2c = SoftI2C(sda=Pin(I2C_SDA), scl=Pin(I2C_SCL))
+        i2c = i2c_bus()
         scan = i2c.scan()
         if not scan:
             raise Exception("no I2C devices found")
         addr = LCD_ADDR if LCD_ADDR in scan else scan[0]
         _lcd = lcd_driver.I2cLcd(i2c, addr, LCD_H, LCD_W)
-        _lcd.clear(); _lcd.putstr("Smart Parking")
+        _frame = LcdFrame(_lcd, LCD_H, LCD_W)
+        _frame.show("Smart Parking")
         _lcd_enabled = True
         print("✅ LCD initialized")
     except Exception as e:
@@ -88,15 +128,75 @@ def _lcd_init():
         _lcd_enabled = False
 
 
-def _lcd_show(line1, line2=""):
+# ---------------- LCD WRITER ----------------
+# The sensors loop never touches the I2C bus for the LCD: it posts frames
+# and lcd_writer draws them on its own thread. There is one pending frame
+# per region. A new frame replaces the one still waiting, so superseded
+# updates never reach the bus. Events (car in / out) go before status
+# frames, and the status screen waits LCD_EVENT_HOLD_MS after an event.
+_lcd_frames = {"event": None, "status": None}
+_lcd_lock = _thread.allocate_lock()   # guards _lcd_frames
+_lcd_wake = _thread.allocate_lock()   # locked while there is nothing to draw
+_lcd_wake.acquire()
+lcd_stats = {"posted": 0, "dropped": 0, "drawn": 0, "errors": 0}
+
+def _lcd_post(region, line1, line2=""):
     if not _lcd_enabled:
         return
+    with _lcd_lock:
+        if _lcd_frames[region] is not None:
+            lcd_stats["dropped"] += 1
+        _lcd_frames[region] = (line1, line2)
+    lcd_stats["posted"] += 1
     try:
-        _lcd.clear()
-        _lcd.move_to(0, 0); _lcd.putstr(line1[:LCD_W])
-        _lcd.move_to(0, 1); _lcd.putstr(line2[:LCD_W])
-    except Exception as e:
-        print(f"⚠️ LCD error: {e}")
+        _lcd_wake.release()  # wake the writer
+    except RuntimeError:
+        pass  # already awake
+
+def _lcd_show(line1, line2=""):
+    _lcd_post("event", line1, line2)
+
+def _lcd_take(hold_until):
+    """Next frame to draw, "hold" while only a held-back status is waiting."""
+    with _lcd_lock:
+        frame = _lcd_frames["event"]
+        if frame is not None:
+            _lcd_frames["event"] = None
+            return "event", frame
+        frame = _lcd_frames["status"]
+        if frame is None:
+            return None, None
+        if hold_until is not None:
+            return "hold", None
+        _lcd_frames["status"] = None
+        return "status", frame
+
+def lcd_writer():
+    hold_until = None  # set only while an event frame holds the status back
+    while True:
+        if hold_until is not None and ticks_diff(hold_until, ticks_ms()) <= 0:
+            hold_until = None  # cleared, or the compare would wrap after ~6 days
+        region, frame = _lcd_take(hold_until)
+        if region is None and hold_until is None:
+            _lcd_wake.acquire()
+            continue
+        if region is None or region == "hold":
+            sleep_ms(50)  # short steps so a new event is not kept waiting
+            continue
+        try:
+            with _i2c_lock:
+                _frame.show(frame[0], frame[1])
+            lcd_stats["drawn"] += 1
+        except Exception as e:
+            lcd_stats["errors"] += 1
+            print(f"⚠️ LCD error: {e}")
+            try:
+                with _i2c_lock:
+                    _frame.invalidate()  # a half-sent frame leaves the shadow wrong
+            except Exception:
+                pass
+        if region == "event":
+            hold_until = ticks_add(ticks_ms(), LCD_EVENT_HOLD_MS)
 
 # ---------------- WIFI ----------------
 def connect_wifi(timeout=15):
@@ -118,23 +218,133 @@ def connect_wifi(timeout=15):
 
 # ---------------- SENSORS ----------------
 _ir = []
-TRIG, ECHO = None, None
+_sonar = None
+_expander = None
+_exp_watch = None
 
 def init_sensors():
-    global _ir, TRIG, ECHO
-    _ir = [Pin(p, Pin.IN, Pin.PULL_UP) for p in IR_PINS]
-    TRIG = Pin(TRIG_PIN, Pin.OUT); ECHO = Pin(ECHO_PIN, Pin.IN)
-    TRIG.off()
+    global _ir, _sonar, _expander, _exp_watch
+    _sonar = HCSR04(TRIG_PIN, ECHO_PIN, window=SONAR_WINDOW)
+    if IR_BACKEND == "expander":
+        _expander = ExpanderSlotSensors(i2c_bus(), EXPANDER_ADDRS, EXPANDER_CHIP, NUM_SLOTS)
+        _exp_watch = SlotWatcher(slots, EXIT_GRACE_MS, assign_id, handle_exit)
+    else:
+        _ir = [Pin(p, Pin.IN, Pin.PULL_UP) for p in IR_PINS]
+        if IR_MODE == "irq":
+            _ir_init_irq()
     print("✅ Sensors ready")
 
+# ---------------- IR EDGE DETECTION ----------------
+# The pin IRQ only timestamps the edge and schedules _ir_settle, which does
+# the debounce and the exit grace period and re-arms a one-shot timer for
+# whatever is still waiting. Confirmed changes are left as bits in
+# _ir_enter / _ir_exit; sensors_loop acts on them (LCD, billing, Telegram)
+# so that work stays on the sensors thread. Bit i is slot i + 1.
+_ir_edge_ms = []     # time of the last edge per sensor
+_ir_clear_ms = []    # when the sensor went clear, None while a car is seen
+_ir_pending = 0      # sensors with an edge that is not debounced yet
+_ir_enter = 0
+_ir_exit = 0
+_ir_timer = None
+
+def _ir_init_irq():
+    global _ir_edge_ms, _ir_clear_ms, _ir_pending, _ir_timer
+    now = ticks_ms()
+    _ir_edge_ms = [now] * len(_ir)
+    _ir_clear_ms = [None] * len(_ir)
+    _ir_timer = Timer(IR_TIMER_ID)
+    for i, pin in enumerate(_ir):
+        pin.irq(trigger=Pin.IRQ_FALLING | Pin.IRQ_RISING, handler=lambda p, i=i: _ir_edge(i))
+    _ir_pending = (1 << len(_ir)) - 1  # pick up cars already parked at boot
+    _ir_kick()
+
+def _ir_edge(i):
+    global _ir_pending
+    _ir_edge_ms[i] = ticks_ms()
+    _ir_pending |= 1 << i
+    _ir_kick()
+
+def _ir_kick(_=None):
+    try:
+        micropython.schedule(_ir_settle, None)
+    except RuntimeError:
+        pass  # schedule queue full, the pending bit is handled on the next run
+
+def _ir_settle(_):
+    global _ir_pending, _ir_enter, _ir_exit
+    now = ticks_ms()
+    wait = None
+    for i, pin in enumerate(_ir):
+        bit = 1 << i
+        if _ir_pending & bit:
+            left = IR_DEBOUNCE_MS - ticks_diff(now, _ir_edge_ms[i])
+            if left > 0:
+                wait = left if wait is None else min(wait, left)
+                continue
+            _ir_pending &= ~bit
+            if pin.value() == 0:  # Car is detected when the sensor reads LOW
+                _ir_clear_ms[i] = None
+                if not slots.is_occupied(i + 1):
+                    _ir_enter |= bit
+            elif _ir_clear_ms[i] is None:
+                _ir_clear_ms[i] = _ir_edge_ms[i]
+        if _ir_clear_ms[i] is not None and (slots.is_occupied(i + 1) or _ir_enter & bit):
+            left = EXIT_GRACE_MS - ticks_diff(now, _ir_clear_ms[i])  # Grace period to confirm exit
+            if left > 0:
+                wait = left if wait is None else min(wait, left)
+            else:
+                _ir_clear_ms[i] = None
+                _ir_exit |= bit
+    if wait is not None:
+        _ir_timer.init(mode=Timer.ONE_SHOT, period=max(1, wait), callback=_ir_kick)
+
+def _ir_apply():
+    """Run the slot logic for changes confirmed by _ir_settle."""
+    global _ir_enter, _ir_exit
+    # Take and clear both masks with interrupts off, so a bit _ir_settle
+    # sets in between cannot be lost (it would never be set again)
+    irq = machine.disable_irq()
+    enter, leave = _ir_enter, _ir_exit
+    _ir_enter = 0
+    _ir_exit = 0
+    machine.enable_irq(irq)
+    for i in range(len(_ir)):
+        bit = 1 << i
+        if enter & bit and not slots.is_occupied(i + 1):
+            assign_id(i + 1)
+        if leave & bit and slots.is_occupied(i + 1):
+            handle_exit(i + 1)
+
+def _ir_poll():
+    for i, pin in enumerate(_ir, 1): 
+        car = (pin.value() == 0)  # Car is detected when the sensor reads LOW
+        occupied = slots.is_occupied(i)
+        if car and not occupied:  # If the car enters an empty slot
+            assign_id(i)  # Assign car to the slot
+        elif not car and occupied:  # If the car leaves an occupied slot
+            if slots.free_since(i) == NO_TIME:
+                slots.set_free_since(i, ticks_ms())
+            elif ticks_diff(ticks_ms(), slots.free_since(i)) >= EXIT_GRACE_MS:  # Grace period to confirm exit
+                handle_exit(i)  # Handle the exit and billing
+
+# ---------------- IR EXPANDERS ----------------
+# One I2C read per 16 slots each pass; the driver only reports slots whose
+# sensor changed, so the slot logic (SlotWatcher) runs for those alone.
+def _exp_poll():
+    _exp_watch.now = ticks_ms()
+    with _i2c_lock:
+        _expander.scan(_exp_watch.change)
+    _exp_watch.expire()
+
 def distance_cm():
-    TRIG.off(); sleep_us(2)
-    TRIG.on(); sleep_us(10)
-    TRIG.off()
-    t = time_pulse_us(ECHO, 1, 30000)
-    if t < 0:
-        return None
-    return (t * 0.0343) / 2
+    """Filtered distance from earlier pings (whole cm), then start the next one.
+
+    Never waits for the echo: the result of this ping shows up in the
+    median on a later call.
+    """
+    d = _sonar.distance_cm()
+    _sonar.trigger()
+    return d
 
 # ---------------- SERVO ----------------
 def _us_to_duty_u16(pulse_us, freq=50):
@@ -149,7 +359,7 @@ def init_servo():
 
 def gate_open():
     global _gate_open
-    if sum(1 for s in slots.values() if not s["occupied"]) > 0:
+    if slots.any_free():
         servo.duty_u16(_us_to_duty_u16(SERVO_OPEN_US))
         _gate_open = True
         print("🚗 Gate opened")
@@ -160,6 +370,53 @@ def gate_close():
     _gate_open = False
     print("🚧 Gate closed")
 
+# ---------------- GATE APPROACH ----------------
+# The sonar pings slowly while the entrance is empty and switches to the
+# burst rate as soon as something comes within APPROACH_CM or gets closer.
+# Opening and closing use how long the car has been seen / not seen rather
+# than counting samples, so the latency does not depend on the ping rate.
+_next_ping = 0
+_burst_until = None  # None once the burst is over
+_last_raw = None
+_near_since = None
+_far_since = None
+
+def _bursting(now):
+    global _burst_until
+    if _burst_until is None:
+        return False
+    if ticks_diff(_burst_until, now) > 0:
+        return True
+    _burst_until = None  # cleared, or the compare would wrap after ~6 days
+    return False
+
+def gate_step(now):
+    global _next_ping, _burst_until, _last_raw, _near_since, _far_since
+    if ticks_diff(now, _next_ping) < 0:
+        return
+    dist = distance_cm()
+    raw = _sonar.last_cm()
+    loop_stats["pings"] += 1
+    if raw is not None and (raw < APPROACH_CM or (_last_raw is not None and raw <= _last_raw - APPROACH_STEP_CM)):
+        _burst_until = ticks_add(now, BURST_HOLD_MS)
+    _last_raw = raw
+    if dist is not None and dist < ENTRY_DISTANCE_CM:
+        _far_since = None
+        if _near_since is None:
+            _near_since = now
+        # Open the gate when a car is detected
+        if not _gate_open and ticks_diff(now, _near_since) >= GATE_CONFIRM_MS:
+            gate_open()
+    else:
+        _near_since = None
+        if _far_since is None:
+            _far_since = now
+        if _gate_open and ticks_diff(now, _far_since) >= GATE_CLEAR_MS:
+            gate_close()
+    if _gate_open:
+        _burst_until = ticks_add(now, BURST_HOLD_MS)  # watch the car through
+    _next_ping = ticks_add(now, SONAR_BURST_MS if _bursting(now) else SONAR_IDLE_MS)
+
 # ---------------- PARKING LOGIC ----------------
 def now_hms(t=None):
     if not t:
@@ -168,38 +425,54 @@ def now_hms(t=None):
     return "{:02d}:{:02d}:{:02d}".format(lt[3], lt[4], lt[5])
 
 def assign_id(slot):
-    tid = min(_available_ids)
-    _available_ids.remove(tid)
-    slots[slot].update(occupied=True, id=tid, time_in=time(), free_since=None)
-    web_dashboard.broadcast_event(f"🚗 Car entered Slot S{slot}")
+    tid = ticket_ids.next()
+    slots.occupy(slot, tid, time())
+    web_dashboard.bump_version(slot)
+    web_dashboard.broadcast_event(f"🚗 Car entered Slot S{slot}", slot)
     _lcd_show(f"Car IN: S{slot}", "Updating...")
     print(f"🎫 OPEN | Slot {slot} | ID {tid} | {now_hms()}")
 
 def handle_exit(slot):
-    s = slots[slot]; tid = s["id"]; t_out = time()
-    duration = max(1, (t_out - s["time_in"]) // 60)
+    tid = slots.ticket(slot); t_in = slots.time_in(slot); t_out = time()
+    duration = max(1, (t_out - t_in) // 60)
     fee = duration * FEE_PER_MIN
-    closed_tickets.append({"id": tid, "slot": slot, "duration": f"{duration} min", "fee": fee, "time_out": now_hms(t_out)})
-    web_dashboard.broadcast_event(f"⬆️ Car exited Slot S{slot} — now FREE")
+    ticket = {"id": tid, "slot": slot, "duration": f"{duration} min", "fee": fee, "time_out": now_hms(t_out)}
+    closed_tickets.append(ticket)
     _lcd_show(f"Car OUT: S{slot}", f"Fee ${fee:.2f}")
     print(f"✅ CLOSE | Slot {slot} | ID {tid} | Fee ${fee:.2f}")
     try:
-        telegram_bot.send_ticket(tid, slot, duration, fee, now_hms(s["time_in"]), now_hms(t_out))
+        telegram_bot.send_ticket(tid, slot, duration, fee, now_hms(t_in), now_hms(t_out))
     except Exception as e:
         print(f"⚠️ Telegram send error: {e}")
-    _available_ids.add(tid)
-    s.update(occupied=False, id=None, time_in=None, time_out=None, free_since=None)
+    slots.release(slot)
+    web_dashboard.bump_version(slot, ticket)
+    web_dashboard.broadcast_event(f"⬆️ Car exited Slot S{slot} — now FREE", slot)
+
+def _free_line():
+    """"Free: S1 S3" while it fits on the LCD, else "Free: 12/200"."""
+    free = slots.free_count()
+    if not free:
+        return "Free: FULL"
+    line = "Free:"
+    i = slots.first_free()
+    while i is not None:
+        line += " S" + str(i)
+        if len(line) > LCD_W:
+            return "Free: {}/{}".format(free, NUM_SLOTS)
+        i = slots.next_free(i)
+    return line
 
 def lcd_update():
-    global _last_lcd_update
+    global _last_lcd_update, _lcd_version, _lcd_gate
     now = ticks_ms()
     if ticks_diff(now, _last_lcd_update) < LCD_REFRESH_MS:
         return
-    free_slots = [f"S{i}" for i, s in slots.items() if not s["occupied"]]
-    line1 = "Free: " + (" ".join(free_slots) if free_slots else "FULL")
-    line2 = "Gate: " + ("Open" if _gate_open else "Closed")
-    _lcd_show(line1, line2)
     _last_lcd_update = now
+    if slots.version == _lcd_version and _gate_open == _lcd_gate:
+        return  # nothing changed, so nothing to build or send
+    _lcd_version, _lcd_gate = slots.version, _gate_open
+    line2 = "Gate: " + ("Open" if _gate_open else "Closed")
+    _lcd_post("status", _free_line(), line2)
 
 # ---------------- DASHBOARD START (robust) ----------------
 def start_dashboard_with_retries(max_attempts=4, wait_s=10):
@@ -224,41 +497,71 @@ def start_dashboard_with_retries(max_attempts=4, wait_s=10):
     print("❌ Dashboard could not start on any port — continuing without dashboard.")
     return False
 
+# ---------------- LOOP INSTRUMENTATION ----------------
+# Updated in place every pass; read with get_loop_stats(). Totals are
+# kept in ms plus a µs carry so they stay small ints (no allocation)
+# instead of growing into a long int after a few hours.
+loop_stats = {"iters": 0, "pings": 0, "last_us": 0, "max_us": 0, "total_ms": 0, "carry_us": 0,
+              "gc_runs": 0, "gc_last_us": 0, "gc_max_us": 0, "gc_total_ms": 0, "gc_carry_us": 0}
+
+def get_loop_stats():
+    st = dict(loop_stats)
+    st["avg_us"] = (st["total_ms"] * 1000 + st["carry_us"]) // st["iters"] if st["iters"] else 0
+    st["mem_free"] = gc.mem_free()
+    return st
+
+def _add_us(total_key, carry_key, dt):
+    c = loop_stats[carry_key] + dt
+    if c >= 1000:
+        loop_stats[total_key] += c // 1000
+        c %= 1000
+    loop_stats[carry_key] = c
+
+def _gc_maybe():
+    if not GC_EVERY_PASS and gc.mem_free() >= GC_FREE_THRESHOLD:
+        return
+    t0 = ticks_us()
+    gc.collect()
+    dt = ticks_diff(ticks_us(), t0)
+    loop_stats["gc_runs"] += 1
+    loop_stats["gc_last_us"] = dt
+    _add_us("gc_total_ms", "gc_carry_us", dt)
+    if dt > loop_stats["gc_max_us"]:
+        loop_stats["gc_max_us"] = dt
+
+def _loop_account(t0):
+    dt = ticks_diff(ticks_us(), t0)
+    loop_stats["iters"] += 1
+    loop_stats["last_us"] = dt
+    _add_us("total_ms", "carry_us", dt)
+    if dt > loop_stats["max_us"]:
+        loop_stats["max_us"] = dt
+
 # ---------------- MAIN LOOP ----------------
+# In steady state (no car events, LCD frame unchanged) a pass allocates
+# nothing: integer distance, range() loops, cached LCD frame, and the GC
+# only runs when free heap falls below GC_FREE_THRESHOLD.
 def sensors_loop():
     print("🚀 Sensors loop running in background thread")
-    detect_hits = miss_hits = 0
     while True:
         try:
-            gc.collect()
-            dist = distance_cm() or 999
-            if dist < ENTRY_DISTANCE_CM:
-                detect_hits += 1
-                miss_hits = 0
-            else:
-                miss_hits += 1
-                detect_hits = 0
-
-            # Open the gate when a car is detected
-            if detect_hits >= 3 and not _gate_open: 
-                gate_open()
-            if miss_hits >= 10 and _gate_open: 
-                gate_close()
-
-            # Check the IR sensor states for each parking slot (1, 2, 3)
-            for i, pin in enumerate(_ir, 1): 
-                car = (pin.value() == 0)  # Car is detected when the sensor reads LOW
-                s = slots[i]  # Access the specific slot
-                if car and not s["occupied"]:  # If the car enters an empty slot
-                    assign_id(i)  # Assign car to the slot
-                elif not car and s["occupied"]:  # If the car leaves an occupied slot
-                    if s["free_since"] is None:
-                        s["free_since"] = ticks_ms()
-                    elif ticks_diff(ticks_ms(), s["free_since"]) >= EXIT_GRACE_MS:  # Grace period to confirm exit
-                        handle_exit(i)  # Handle the exit and billing
+            t0 = ticks_us()
+            now = ticks_ms()
+            _gc_maybe()
+            gate_step(now)  # adaptive-rate sonar + gate open/close
+
+            # Check the IR sensor states for each parking slot (1, 2, 3);
+            # in IRQ mode there is only work when an edge was confirmed
+            if IR_BACKEND == "expander":
+                _exp_poll()
+            elif IR_MODE != "irq":
+                _ir_poll()
+            elif _ir_enter or _ir_exit:
+                _ir_apply()
 
             lcd_update()  # Update the LCD with the current slot status
-            sleep(0.1)  # Small delay for sensor updates
+            _loop_account(t0)
+            sleep_ms(SONAR_BURST_MS if _bursting(now) else LOOP_PERIOD_MS)
         except Exception as e:
             print(f"⚠️ Sensors loop error: {e}")
             sleep(0.5)
@@ -288,6 +591,8 @@ if __name__ == "__main__":
     print(f"✅ System ready! Open dashboard at http://{ip if ip else 'ESP32-IP'}:8080 (or 8000, 8888)")
     print(f"🧠 Free memory: {gc.mem_free()} bytes")
 
+    if _lcd_enabled:
+        _thread.start_new_thread(lcd_writer, ())
     _thread.start_new_thread(sensors_loop, ())
     start_dashboard_with_retries()
 
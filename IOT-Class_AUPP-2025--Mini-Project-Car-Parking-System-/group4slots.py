@@ -0,0 +1,133 @@
+# group4slots.py — Array-backed slot table for the Smart Parking System
+# One column per field instead of a dict per slot, so a lot with hundreds
+# of slots costs a few bytes per slot. Slots are numbered 1..n like the
+# IR sensors. The mapping methods (slots[i], items(), get(), ...) return
+# plain dict snapshots for the dashboard; the sensor code uses the column
+# accessors, which do not allocate.
+#
+# The free/occupied counters and the lowest free slot are kept up to date
+# by occupy() / release(), so "any free?", "how many free?" and "first
+# free" are O(1) for every consumer (gate, LCD, dashboard).
+from array import array
+
+NO_TIME = -1  # free_since when the slot is not counting down an exit
+
+
+class SlotTable:
+    def __init__(self, num_slots):
+        self.num_slots = num_slots
+        n = num_slots + 1  # index 0 unused, slot numbers start at 1
+        self._occ = bytearray((n + 7) // 8)         # occupied bitmap
+        self._id = array("L", [0] * n)              # ticket id, 0 = none
+        self._time_in = array("L", [0] * n)         # epoch seconds, 0 = none
+        self._free_since = array("l", [NO_TIME] * n)  # ticks_ms, NO_TIME = none
+        self.version = 0  # bumped on every occupy/release
+        self._occupied = 0
+        self._first_free = 1 if num_slots else 0  # 0 = lot full
+
+    # ---- column access (no allocation) ----
+    def is_occupied(self, i):
+        return self._occ[i >> 3] & (1 << (i & 7)) != 0
+
+    def ticket(self, i):
+        return self._id[i]
+
+    def time_in(self, i):
+        return self._time_in[i]
+
+    def free_since(self, i):
+        return self._free_since[i]
+
+    def set_free_since(self, i, ms):
+        self._free_since[i] = ms
+
+    def occupy(self, i, ticket_id, time_in):
+        if not self.is_occupied(i):
+            self._occ[i >> 3] |= 1 << (i & 7)
+            self._occupied += 1
+            if i == self._first_free:
+                self._first_free = self._scan_free(i + 1)
+        self._id[i] = ticket_id
+        self._time_in[i] = time_in
+        self._free_since[i] = NO_TIME
+        self.version += 1
+
+    def release(self, i):
+        if self.is_occupied(i):
+            self._occ[i >> 3] &= ~(1 << (i & 7)) & 0xFF
+            self._occupied -= 1
+            if self._first_free == 0 or i < self._first_free:
+                self._first_free = i
+        self._id[i] = 0
+        self._time_in[i] = 0
+        self._free_since[i] = NO_TIME
+        self.version += 1
+
+    # ---- free index ----
+    def _scan_free(self, start):
+        """Lowest free slot >= start, 0 if none; skips full bytes at once."""
+        i = start
+        n = self.num_slots
+        occ = self._occ
+        while i <= n:
+            if not i & 7 and occ[i >> 3] == 0xFF:
+                i += 8
+                continue
+            if not occ[i >> 3] & (1 << (i & 7)):
+                return i
+            i += 1
+        return 0
+
+    def occupied_count(self):
+        return self._occupied
+
+    def free_count(self):
+        return self.num_slots - self._occupied
+
+    def any_free(self):
+        return self._occupied < self.num_slots
+
+    def first_free(self):
+        return self._first_free or None
+
+    def next_free(self, after):
+        """Next free slot after `after`, None if there is none."""
+        return self._scan_free(after + 1) or None
+
+    # ---- dict-like view for the dashboard ----
+    def as_dict(self, i):
+        occ = self.is_occupied(i)
+        fs = self._free_since[i]
+        return {"occupied": occ,
+                "id": self._id[i] if occ else None,
+                "time_in": self._time_in[i] if occ else None,
+                "time_out": None,
+                "free_since": None if fs == NO_TIME else fs}
+
+    def __len__(self):
+        return self.num_slots
+
+    def __contains__(self, i):
+        return 1 <= i <= self.num_slots
+
+    def __getitem__(self, i):
+        if i not in self:
+            raise KeyError(i)
+        return self.as_dict(i)
+
+    def get(self, i, default=None):
+        return self.as_dict(i) if i in self else default
+
+    def keys(self):
+        return range(1, self.num_slots + 1)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def items(self):
+        for i in range(1, self.num_slots + 1):
+            yield i, self.as_dict(i)
+
+    def values(self):
+        for i in range(1, self.num_slots + 1):
+            yield self.as_dict(i)
@@ -1,15 +1,77 @@
 try:
-    import urequests as requests
+    import usocket as socket
 except ImportError:
-    import requests
+    import socket
+try:
+    import ussl as ssl
+except ImportError:
+    import ssl
+try:
+    from ucollections import deque
+except ImportError:
+    from collections import deque
 import _thread
 import gc
-from time import sleep
+import json
+import os
+from time import sleep_ms, ticks_ms, ticks_diff, ticks_add
 
 BOT_TOKEN = None
 GROUP_CHAT = None
 API_BASE = None
-telegram_queue = []  # Queue to store messages before sending
+API_HOST = "api.telegram.org"
+API_PORT = 443
+HTTP_TIMEOUT_S = 10
+
+# ---------------- OUTBOX ----------------
+# One bounded FIFO per priority; the worker always drains alerts first.
+PRIO_ALERT, PRIO_RECEIPT = 0, 1
+OUTBOX_SIZE = 32            # per priority, the oldest message is dropped when full
+
+# Telegram allows about one message per second in a chat and at most
+# 20 per minute in a group, so refill 20 tokens/min with a small burst.
+RATE_PER_MIN = 20
+BURST = 3
+MIN_GAP_MS = 1000
+
+_outbox = (deque((), OUTBOX_SIZE), deque((), OUTBOX_SIZE))
+_wake = _thread.allocate_lock()  # locked while there is nothing to send
+_wake.acquire()
+
+_tokens = BURST
+_last_refill = 0
+_last_send = 0
+
+# A failed send stays queued; the worker then pauses, doubling the pause
+# on every failure in a row, so an outage is ridden out without hammering
+# the network and without losing the message
+RETRY_MIN_MS = 2000
+RETRY_MAX_MS = 60000
+_retry_ms = 0
+_retry_at = None            # ticks_ms of the next attempt while backing off
+
+# Counters, readable at any time through get_stats()
+_stats = {"enqueued": 0, "sent": 0, "failed": 0, "dropped": 0, "replayed": 0,
+          "unconfirmed": 0, "last_latency_ms": 0, "max_latency_ms": 0, "total_latency_ms": 0}
+
+# ---------------- DURABLE LOG ----------------
+# Queued messages are also appended to a log on flash so a reset does not
+# lose them. Lines are "M <seq> <prio> <chat_id> <json text>" for a message
+# and "A <seq>" once it is sent (or dropped). Lines are buffered in RAM and
+# written by the worker in one append per batch (group commit); the file is
+# only rewritten at boot and when it outgrows COMPACT_BYTES, keeping just
+# the messages still owed.
+OUTBOX_FILE = "tg_outbox.log"
+COMMIT_WINDOW_MS = 100      # after a wake-up, wait this long to batch a burst
+COMPACT_BYTES = 8192        # rewrite the log at this size
+
+_log_pending = []
+_seq = 0
+_unacked = 0
+# enqueue() runs on the sensors thread and _ack() on the worker: _seq,
+# _unacked, _log_pending (and _push / _ack) are only touched with this held
+_log_lock = _thread.allocate_lock()
+_compact_at = COMPACT_BYTES  # raised when the owed messages alone are this big
 
 # Flag to track if the bot is initialized
 is_bot_initialized = False
@@ -22,50 +84,392 @@ def set_config(bot_token, group_chat_id):
     API_BASE = f"https://api.telegram.org/bot{BOT_TOKEN}"
     is_bot_initialized = True  # Mark the bot as initialized
     print(f"🤖 Telegram configured | Group ID: {GROUP_CHAT}")
+    try:
+        replay_outbox()
+    except Exception as e:
+        print("⚠️ Outbox replay failed:", e)
     _thread.start_new_thread(telegram_worker, ())  # Start worker thread for sending messages
 
-# URL encoding for special characters (e.g., spaces, newlines)
-def url_encode(text):
-    text = str(text).replace("✅", "%E2%9C%85").replace("\n", "%0A").replace(" ", "%20")
-    return text
+def _tls_wrap(sock, host):
+    make_ctx = getattr(ssl, "create_default_context", None)
+    if make_ctx is None:  # MicroPython
+        return ssl.wrap_socket(sock, server_hostname=host)
+    # CPython, used for desk testing against a local stand-in server;
+    # like MicroPython's ssl the certificate is not verified.
+    ctx = make_ctx()
+    ctx.check_hostname = False
+    ctx.verify_mode = ssl.CERT_NONE
+    return ctx.wrap_socket(sock, server_hostname=host)
+
+
+# The request went out but no reply came back: Telegram may well have
+# posted the message, so it must not be sent again
+class MaybeSent(OSError):
+    pass
+
+
+# Keep-alive HTTPS connection to the Bot API. The TLS handshake is by far
+# the most expensive part of a send on the ESP32, so it is done once and
+# the connection is reused until the server closes it.
+class TelegramSession:
+    def __init__(self, host=API_HOST, port=API_PORT):
+        self.host = host
+        self.port = port
+        self.sock = None
+        self.f = None
+
+    def connect(self):
+        self.close()
+        gc.collect()  # the handshake needs a large contiguous block
+        addr = socket.getaddrinfo(self.host, self.port, 0, socket.SOCK_STREAM)[0][-1]
+        s = socket.socket()
+        s.settimeout(HTTP_TIMEOUT_S)
+        try:
+            s.connect(addr)
+            self.sock = _tls_wrap(s, self.host)
+        except Exception:
+            s.close()
+            raise
+        # CPython needs a file object for readline(); MicroPython's SSL
+        # socket is already a stream.
+        self.f = self.sock.makefile("rwb") if hasattr(self.sock, "makefile") else self.sock
+
+    def close(self):
+        if self.sock:
+            try:
+                self.sock.close()
+            except Exception:
+                pass
+        self.sock = self.f = None
+
+    def post_json(self, path, obj):
+        """POST obj as JSON; returns (status, body bytes).
+
+        A reused connection the server dropped while idle shows up as a
+        failed write or as EOF before the status line, and only then is
+        the request retried once on a fresh connection. A timeout waiting
+        for the reply raises MaybeSent instead: the server may already have
+        acted on the request, and resending would post the message twice.
+        """
+        body = json.dumps(obj).encode()
+        head = ("POST {} HTTP/1.1\r\nHost: {}\r\nContent-Type: application/json\r\n"
+                "Content-Length: {}\r\nConnection: keep-alive\r\n\r\n").format(path, self.host, len(body))
+        for attempt in (0, 1):
+            fresh = self.sock is None
+            if fresh:
+                self.connect()
+            try:
+                # One write, so head and body leave in one TLS record
+                # instead of waiting on Nagle / delayed ACK between them.
+                self.f.write(head.encode() + body)
+                if hasattr(self.f, "flush"):
+                    self.f.flush()
+            except Exception:
+                self.close()
+                if fresh or attempt:
+                    raise
+                continue
+            try:
+                line = self.f.readline()
+            except Exception as e:
+                self.close()
+                raise MaybeSent("no reply: {}".format(e))
+            if not line:
+                self.close()
+                if fresh or attempt:
+                    raise OSError("connection closed by server")
+                continue
+            try:
+                status = int(line.split(None, 2)[1])
+            except (IndexError, ValueError):
+                self.close()
+                raise OSError("bad status line")
+            try:
+                return status, self._read_body()
+            except Exception:
+                # The status is in, so the request was handled; the body is
+                # not needed, just drop the connection we lost track of
+                self.close()
+                return status, b""
+
+    def _read_body(self):
+        length = None
+        chunked = False
+        keep = True
+        while True:
+            h = self.f.readline()
+            if not h or h == b"\r\n":
+                break
+            k, _, v = h.decode().partition(":")
+            k = k.strip().lower()
+            if k == "content-length":
+                length = int(v)
+            elif k == "transfer-encoding" and "chunked" in v.lower():
+                chunked = True
+            elif k == "connection" and v.strip().lower() == "close":
+                keep = False
+        if chunked:
+            body = self._read_chunked()
+        elif length is None:
+            body = self.f.read()  # no length: body runs to the end of the connection
+            keep = False
+        else:
+            body = self.f.read(length) if length else b""
+        if not keep:
+            self.close()
+        return body
+
+    def _read_chunked(self):
+        parts = []
+        while True:
+            size = int(self.f.readline().split(b";", 1)[0].strip(), 16)
+            if not size:
+                break
+            parts.append(self.f.read(size))
+            self.f.readline()  # CRLF after the chunk
+        while True:  # trailers, up to the blank line
+            h = self.f.readline()
+            if not h or h == b"\r\n":
+                break
+        return b"".join(parts)
+
+
+_session = None
+
+# _deliver() results
+_SENT, _RETRY, _REJECTED, _MAYBE_SENT = 0, 1, 2, 3
 
 # Send a message to Telegram chat
 def send_message(chat_id, text):
+    return _deliver(chat_id, text) == _SENT
+
+
+def _deliver(chat_id, text):
+    global _session
     if not is_bot_initialized:
         print("❌ Telegram Bot not initialized!")
-        return False
+        return _RETRY
     
     if not API_BASE:
-        return False
+        return _RETRY
     
-    res = None
+    if _session is None:
+        _session = TelegramSession(API_HOST, API_PORT)
     try:
-        url = f"{API_BASE}/sendMessage?chat_id={chat_id}&text={url_encode(text)}"
-        print("DEBUG: Sending URL:", url)
-        gc.collect()
-        res = requests.get(url, timeout=10)  # Sending the request
-        print("DEBUG: Telegram HTTP status:", res.status_code)
-        _ = res.text  # Consume the response to close the connection
+        status, body = _session.post_json(f"/bot{BOT_TOKEN}/sendMessage", {"chat_id": chat_id, "text": text})
+        if status != 200:
+            print("❌ Telegram HTTP status:", status, body[:120])
+            # a 4xx other than 429 (rate limited) fails the same way every time
+            return _REJECTED if 400 <= status < 500 and status != 429 else _RETRY
         print("✅ Telegram sent:", text)
-        return True
+        return _SENT
+    except MaybeSent as e:
+        print("⚠️ Telegram reply lost, not resending:", e)
+        return _MAYBE_SENT
     except Exception as e:
         print("❌ Telegram error:", e)
-        return False
-    finally:
-        try:
-            if res:
-                res.close()  # Close the connection
-        except Exception:
-            pass
-        gc.collect()
+        return _RETRY
+
+# Queue a message; returns immediately, the worker thread sends it
+def enqueue(chat_id, text, prio=PRIO_RECEIPT):
+    global _seq, _unacked
+    fields = _m_fields(prio, chat_id, text)  # serialize outside the lock
+    with _log_lock:
+        _seq += 1
+        _unacked += 1
+        _log_pending.append("M {} {}".format(_seq, fields))
+        _push(_seq, chat_id, text, prio)
+    _stats["enqueued"] += 1
+    try:
+        _wake.release()  # wake the worker
+    except RuntimeError:
+        pass  # already awake
+
+
+def _m_fields(prio, chat_id, text):
+    return "{} {} {}\n".format(prio, json.dumps(chat_id), json.dumps(text))
+
+
+# Called with _log_lock held
+def _push(seq, chat_id, text, prio, t0=None):
+    q = _outbox[prio]
+    if len(q) >= OUTBOX_SIZE:
+        _ack(q.popleft()[3])
+        _stats["dropped"] += 1
+    q.append((ticks_ms() if t0 is None else t0, chat_id, text, seq, prio))
+
+
+# Called with _log_lock held
+def _ack(seq):
+    global _unacked
+    _unacked -= 1
+    _log_pending.append("A {}\n".format(seq))
+
+
+# Write all buffered log lines with a single append
+def _commit():
+    with _log_lock:
+        if not _log_pending:
+            return
+        lines = _log_pending[:]
+        del _log_pending[:]
+    try:
+        with open(OUTBOX_FILE, "a") as f:
+            for i in range(len(lines)):
+                f.write(lines[i])
+        if os.stat(OUTBOX_FILE)[6] >= _compact_at:
+            _compact()
+    except OSError as e:
+        print("⚠️ Outbox log write failed:", e)
+
+
+# Rewrite the log with only the messages still owed. Only the worker calls
+# this, between sends, so every unacked message is in _outbox; lines queued
+# meanwhile are covered by the snapshot or appended after the swap.
+def _compact():
+    global _compact_at
+    with _log_lock:
+        lines = ["M {} {}".format(m[3], _m_fields(m[4], m[1], m[2])) for q in _outbox for m in q]
+        del _log_pending[:]
+    tmp = OUTBOX_FILE + ".tmp"
+    size = 0
+    with open(tmp, "w") as f:
+        for i in range(len(lines)):
+            size += f.write(lines[i])
+    os.rename(tmp, OUTBOX_FILE)  # swap in one step, a reset mid-rewrite keeps the old log
+    _compact_at = max(COMPACT_BYTES, 2 * size)  # don't rewrite on every append during an outage
+
+
+# Re-queue messages that were logged but never acked (call once at boot)
+def replay_outbox():
+    global _seq, _unacked
+    pending = {}
+    acked = 0
+    torn = False
+    try:
+        f = open(OUTBOX_FILE, "rb")  # bytes: a reset can cut a UTF-8 character in half
+    except OSError:
+        return 0
+    with f:
+        for line in f:
+            parts = line.rstrip(b"\n").split(b" ", 4)
+            try:
+                seq = int(parts[1])
+            except (IndexError, ValueError):
+                torn = True  # torn last line after a reset mid-write
+                continue
+            if seq > _seq:
+                _seq = seq  # never reuse a number, even from a torn line
+            if not line.endswith(b"\n"):
+                torn = True
+                continue
+            try:
+                if parts[0] == b"M":
+                    pending[seq] = (int(parts[2]), json.loads(parts[3].decode()), json.loads(parts[4].decode()))
+                elif parts[0] == b"A":
+                    pending.pop(seq, None)
+                    acked += 1
+            except (IndexError, ValueError, UnicodeError):
+                torn = True
+    # One rewrite per boot, keeping only what is still owed; a torn tail
+    # must go too, or the next append would be glued onto it
+    if acked or torn:
+        tmp = OUTBOX_FILE + ".tmp"
+        with open(tmp, "w") as f:
+            for seq in sorted(pending):
+                prio, chat_id, text = pending[seq]
+                f.write("M {} {}".format(seq, _m_fields(prio, chat_id, text)))
+        os.rename(tmp, OUTBOX_FILE)  # swap in one step, a reset mid-rewrite keeps the old log
+    with _log_lock:
+        for seq in sorted(pending):
+            prio, chat_id, text = pending[seq]
+            _unacked += 1
+            _push(seq, chat_id, text, prio)
+    _stats["replayed"] += len(pending)
+    if pending:
+        print(f"📨 Replaying {len(pending)} unsent Telegram message(s)")
+    return len(pending)
+
+
+def queue_depth():
+    return len(_outbox[PRIO_ALERT]) + len(_outbox[PRIO_RECEIPT])
+
+
+def get_stats():
+    st = dict(_stats)
+    st["depth"] = queue_depth()
+    st["avg_latency_ms"] = st["total_latency_ms"] // st["sent"] if st["sent"] else 0
+    return st
+
+
+def _next_message():
+    for q in _outbox:
+        if q:
+            return q.popleft()
+    return None
+
+
+# Token bucket: block until one message may be sent
+def _take_token():
+    global _tokens, _last_refill
+    while True:
+        now = ticks_ms()
+        _tokens = min(BURST, _tokens + ticks_diff(now, _last_refill) * RATE_PER_MIN / 60000)
+        _last_refill = now
+        gap = MIN_GAP_MS - ticks_diff(now, _last_send)
+        if _tokens >= 1 and gap <= 0:
+            _tokens -= 1
+            return
+        wait = max(gap, int((1 - _tokens) * 60000 / RATE_PER_MIN) + 1)
+        sleep_ms(wait)
+
 
-# Worker thread that processes the telegram queue and sends messages
+# Worker thread: sleeps until something is enqueued, then sends in
+# priority order as fast as the rate limit allows
 def telegram_worker():
+    global _last_refill, _last_send, _retry_ms, _retry_at
+    _last_refill = ticks_ms()
+    _last_send = ticks_add(_last_refill, -MIN_GAP_MS)
     while True:
-        if telegram_queue:  # Check if there are messages in the queue
-            chat_id, msg = telegram_queue.pop(0)  # Get the first message
-            send_message(chat_id, msg)  # Send the message
-        sleep(1)  # Sleep for a second to prevent high CPU usage
+        _commit()  # a message is on flash before its first send attempt
+        if _retry_at is not None:
+            wait = ticks_diff(_retry_at, ticks_ms())
+            if wait > 0:
+                sleep_ms(min(wait, 1000))  # wake now and then to commit new messages
+                continue
+            _retry_at = None
+        item = _next_message()
+        if item is None:
+            _wake.acquire()
+            sleep_ms(COMMIT_WINDOW_MS)
+            continue
+        t0, chat_id, msg, seq, prio = item
+        _take_token()
+        _last_send = ticks_ms()
+        result = _deliver(chat_id, msg)
+        if result == _RETRY:
+            _stats["failed"] += 1
+            with _log_lock:
+                _push(seq, chat_id, msg, prio, t0)  # retry at the back of its queue
+            _retry_ms = min(RETRY_MAX_MS, max(RETRY_MIN_MS, 2 * _retry_ms))
+            _retry_at = ticks_add(ticks_ms(), _retry_ms)
+            continue
+        _retry_ms = 0
+        with _log_lock:
+            _ack(seq)
+        if result == _REJECTED:
+            _stats["failed"] += 1
+            _stats["dropped"] += 1
+            continue
+        if result == _MAYBE_SENT:
+            _stats["unconfirmed"] += 1  # acked: at most once beats posting it twice
+            continue
+        lat = ticks_diff(ticks_ms(), t0)
+        _stats["sent"] += 1
+        _stats["last_latency_ms"] = lat
+        _stats["total_latency_ms"] += lat
+        if lat > _stats["max_latency_ms"]:
+            _stats["max_latency_ms"] = lat
 
 # Send a ticket message to the Telegram group
 def send_ticket(ticket_id, slot_num, minutes, fee, time_in=None, time_out=None):
@@ -73,13 +477,13 @@ def send_ticket(ticket_id, slot_num, minutes, fee, time_in=None, time_out=None):
     if time_in and time_out:
         msg += f"\nTime-In:{time_in}\nTime-Out:{time_out}"
     
-    # Add the message to the queue for sending
-    telegram_queue.append((GROUP_CHAT, msg))
+    # Add the message to the outbox for sending
+    enqueue(GROUP_CHAT, msg, PRIO_RECEIPT)
 
 # Test the Telegram bot functionality
 def test_telegram():
     if is_bot_initialized:
-        telegram_queue.append((GROUP_CHAT, "Test message from ESP32 Smart Parking System"))
+        enqueue(GROUP_CHAT, "Test message from ESP32 Smart Parking System", PRIO_ALERT)
     else:
         print("⚠️ Telegram Bot not initialized yet.")
 
@@ -87,11 +491,11 @@ def test_telegram():
 def notify_full_parking():
     if is_bot_initialized:
         message = "🚧 Parking is FULL! No space available."
-        telegram_queue.append((GROUP_CHAT, message))
+        enqueue(GROUP_CHAT, message, PRIO_ALERT)
 
 # Notify the Telegram group when a slot becomes free
 def notify_free_slot(slot_num):
     if is_bot_initialized:
         message = f"🚗 Slot S{slot_num} is now FREE!"
-        telegram_queue.append((GROUP_CHAT, message))
+        enqueue(GROUP_CHAT, message, PRIO_ALERT)
 
@@ -0,0 +1,52 @@
+# group4ticketids.py — Ticket numbers for the Smart Parking System
+# Ticket numbers are never reused: each one is one more than the last, they
+# survive a reboot, and they wrap only after 2^32 - 1 tickets. Flash holds
+# the end of the block of numbers already reserved. Numbers are handed out
+# from RAM, and the file is only rewritten when a block runs out. A reset
+# skips what was left of the block, which keeps numbers unique at the cost
+# of a small gap.
+import os
+
+ID_FILE = "ticket_ids.txt"
+MAX_ID = 0xFFFFFFFF  # fits the SlotTable "L" column; 0 means "no ticket"
+
+
+class TicketIds:
+    def __init__(self, path=ID_FILE, block=64):
+        self.path = path
+        self.block = block
+        self._next = self._load()
+        self._limit = self._next  # nothing reserved yet this boot
+        self.flash_writes = 0
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                n = int(f.read().strip())
+        except (OSError, ValueError):
+            return 1
+        return n if 1 <= n <= MAX_ID else 1
+
+    def _reserve(self):
+        start = self._next
+        limit = start + self.block
+        if limit > MAX_ID:
+            start, limit = 1, 1 + self.block  # wrapped after 2^32 - 1 tickets
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(str(limit))
+        os.rename(tmp, self.path)  # replace in one step, a reset never leaves a torn file
+        self._next, self._limit = start, limit
+        self.flash_writes += 1
+
+    def next(self):
+        """A new ticket number, greater than every one issued before."""
+        if self._next >= self._limit:
+            self._reserve()
+        tid = self._next
+        self._next += 1
+        return tid
+
+    def peek(self):
+        """The number the next ticket will get (for display / logs)."""
+        return self._next
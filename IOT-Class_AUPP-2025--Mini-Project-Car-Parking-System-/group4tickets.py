@@ -0,0 +1,42 @@
+# group4tickets.py — Closed-ticket store for the Smart Parking System
+# Fixed-capacity ring buffer: memory stays flat however busy the lot gets,
+# the oldest tickets are overwritten once it is full.
+
+
+class TicketRing:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._buf = [None] * capacity
+        self._head = 0      # index the next ticket is written to
+        self._len = 0
+        self.total = 0      # tickets ever appended, including overwritten ones
+
+    def append(self, ticket):
+        self._buf[self._head] = ticket
+        self._head = (self._head + 1) % self.capacity
+        if self._len < self.capacity:
+            self._len += 1
+        self.total += 1
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, i):
+        """Index like a list, 0 is the oldest kept ticket and -1 the newest."""
+        if i < 0:
+            i += self._len
+        if i < 0 or i >= self._len:
+            raise IndexError("ticket index out of range")
+        return self._buf[(self._head - self._len + i) % self.capacity]
+
+    def __iter__(self):
+        for i in range(self._len):
+            yield self[i]
+
+    def page(self, offset=0, limit=10):
+        """Newest-first slice: offset 0 is the most recent ticket."""
+        out = []
+        end = min(self._len, offset + limit)
+        for i in range(offset, end):
+            out.append(self[-1 - i])
+        return out
@@ -0,0 +1,202 @@
+# Host tests for group4ir_expander: the expander driver and SlotWatcher run
+# against FakeI2C, a stand-in for an I2C bus with expanders on it.
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from group4ir_expander import ExpanderSlotSensors, SlotWatcher, MCP23017, PCF8575
+from group4slots import SlotTable, NO_TIME
+
+GRACE_MS = 1000
+
+
+class FakeI2C:
+    """I2C bus with expanders at addrs; set_car() flips a sensor."""
+
+    def __init__(self, addrs, active_low=True):
+        self.addrs = tuple(addrs)
+        self._idle = 0xFF if active_low else 0x00
+        self.ports = {a: bytearray([self._idle, self._idle]) for a in self.addrs}
+        self.reads = 0
+        self.writes = 0
+
+    def _port(self, addr):
+        if addr not in self.ports:
+            raise OSError(19)  # ENODEV, what a missing device gives on the ESP32
+        return self.ports[addr]
+
+    def set_car(self, slot, present):
+        k, bit = divmod(slot - 1, 16)
+        port = self.ports[self.addrs[k]]
+        mask = 1 << (bit & 7)
+        if present == (self._idle == 0xFF):
+            port[bit >> 3] &= ~mask & 0xFF
+        else:
+            port[bit >> 3] |= mask
+
+    def writeto_mem(self, addr, reg, buf):
+        self._port(addr)
+        self.writes += 1
+
+    def writeto(self, addr, buf):
+        self._port(addr)
+        self.writes += 1
+
+    def readfrom_mem_into(self, addr, reg, buf):
+        self.readfrom_into(addr, buf)
+
+    def readfrom_into(self, addr, buf):
+        port = self._port(addr)
+        for i in range(len(buf)):
+            buf[i] = port[i]
+        self.reads += 1
+
+
+class Lot:
+    """Expander, slot table and watcher wired up like group4main does."""
+
+    def __init__(self, num_slots=20, addrs=(0x20, 0x21), chip=MCP23017):
+        self.bus = FakeI2C(addrs)
+        self.sensors = ExpanderSlotSensors(self.bus, addrs, chip, num_slots)
+        self.slots = SlotTable(num_slots)
+        self.entered = []
+        self.exited = []
+        self.watch = SlotWatcher(self.slots, GRACE_MS, self._enter, self._exit)
+
+    def _enter(self, slot):
+        self.entered.append(slot)
+        self.slots.occupy(slot, slot, 0)
+
+    def _exit(self, slot):
+        self.exited.append(slot)
+        self.slots.release(slot)
+
+    def poll(self, now):
+        self.watch.now = now
+        self.sensors.scan(self.watch.change)
+        self.watch.expire()
+
+
+def changes(sensors):
+    seen = []
+    n = sensors.scan(lambda slot, car: seen.append((slot, car)))
+    assert n == len(seen)
+    return seen
+
+
+@pytest.mark.parametrize("chip", [MCP23017, PCF8575])
+def test_scan_reports_only_changed_slots(chip):
+    bus = FakeI2C((0x20, 0x21))
+    sensors = ExpanderSlotSensors(bus, bus.addrs, chip)
+    assert changes(sensors) == []
+    bus.set_car(1, True)
+    bus.set_car(12, True)
+    bus.set_car(17, True)
+    assert changes(sensors) == [(1, True), (12, True), (17, True)]
+    assert changes(sensors) == []
+    bus.set_car(12, False)
+    assert changes(sensors) == [(12, False)]
+
+
+def test_scan_reads_each_expander_once():
+    bus = FakeI2C((0x20, 0x21))
+    sensors = ExpanderSlotSensors(bus, bus.addrs)
+    sensors.scan(lambda slot, car: None)
+    assert bus.reads == 2
+
+
+def test_slots_past_num_slots_are_ignored():
+    bus = FakeI2C((0x20,))
+    sensors = ExpanderSlotSensors(bus, bus.addrs, num_slots=3)
+    bus.set_car(3, True)
+    bus.set_car(4, True)
+    assert changes(sensors) == [(3, True)]
+
+
+def test_active_high_sensors():
+    bus = FakeI2C((0x20,), active_low=False)
+    sensors = ExpanderSlotSensors(bus, bus.addrs, active_low=False)
+    bus.set_car(5, True)
+    assert changes(sensors) == [(5, True)]
+
+
+def test_missing_expander_raises():
+    with pytest.raises(OSError):
+        ExpanderSlotSensors(FakeI2C((0x20,)), (0x20, 0x27))
+
+
+def test_car_in_assigns_slot_once():
+    lot = Lot()
+    lot.bus.set_car(7, True)
+    lot.poll(0)
+    lot.poll(100)
+    assert lot.entered == [7]
+    assert lot.slots.is_occupied(7)
+
+
+def test_exit_confirmed_after_grace_period():
+    lot = Lot()
+    lot.bus.set_car(7, True)
+    lot.poll(0)
+    lot.bus.set_car(7, False)
+    lot.poll(100)
+    assert lot.slots.free_since(7) == 100
+    lot.poll(100 + GRACE_MS - 1)
+    assert lot.exited == []
+    lot.poll(100 + GRACE_MS)
+    assert lot.exited == [7]
+    assert not lot.slots.is_occupied(7)
+
+
+def test_glitch_within_grace_period_keeps_ticket():
+    lot = Lot()
+    lot.bus.set_car(3, True)
+    lot.poll(0)
+    lot.bus.set_car(3, False)
+    lot.poll(100)
+    lot.bus.set_car(3, True)  # sensor blinked, the car never left
+    lot.poll(300)
+    lot.poll(5000)
+    assert lot.exited == []
+    assert lot.entered == [3]
+    assert lot.slots.free_since(3) == NO_TIME
+
+
+def test_glitch_between_scans_is_not_seen():
+    lot = Lot()
+    lot.bus.set_car(3, True)
+    lot.poll(0)
+    lot.bus.set_car(3, False)
+    lot.bus.set_car(3, True)
+    lot.poll(100)
+    lot.poll(100 + GRACE_MS)
+    assert lot.exited == []
+
+
+def test_clear_free_slot_is_not_an_exit():
+    lot = Lot()
+    lot.bus.set_car(9, True)
+    lot.poll(0)
+    lot.slots.release(9)  # freed some other way meanwhile
+    lot.bus.set_car(9, False)
+    lot.poll(100)
+    lot.poll(100 + GRACE_MS)
+    assert lot.exited == []
+
+
+def test_exits_on_several_slots_expire_independently():
+    lot = Lot()
+    for slot in (2, 18):
+        lot.bus.set_car(slot, True)
+    lot.poll(0)
+    lot.bus.set_car(2, False)
+    lot.poll(100)
+    lot.bus.set_car(18, False)
+    lot.poll(600)
+    lot.poll(100 + GRACE_MS)
+    assert lot.exited == [2]
+    lot.poll(600 + GRACE_MS)
+    assert lot.exited == [2, 18]
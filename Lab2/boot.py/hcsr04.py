@@ -0,0 +1,98 @@
+# hcsr04.py — Non-blocking HC-SR04 driver for ESP32 (MicroPython)
+# trigger() fires a 10 µs pulse and returns; a hard IRQ on ECHO times both
+# edges and stores the result in a small ring buffer. distance_cm() returns
+# the median of the last readings, so nothing ever waits on the echo.
+from machine import Pin
+from time import sleep_us, sleep_ms, ticks_us, ticks_ms, ticks_diff
+from array import array
+
+NO_ECHO = 0xFFFF        # stored for a ping that saw nothing in range
+MAX_RANGE_CM = 400      # HC-SR04 datasheet limit
+CYCLE_MS = 60           # datasheet minimum between pings, lets old echoes die out
+
+
+class HCSR04:
+    def __init__(self, trig_pin, echo_pin, window=3, timeout_us=30000):
+        self.trig = Pin(trig_pin, Pin.OUT)
+        self.echo = Pin(echo_pin, Pin.IN)
+        self.trig.off()
+        self.timeout_us = timeout_us
+        self._buf = array("H", [NO_ECHO] * window)  # last readings in cm
+        self._tmp = array("H", [NO_ECHO] * window)  # scratch for the median
+        self._head = 0
+        self._rise = 0
+        self._fired = 0
+        self._busy = False
+        self._stamp = None  # ticks_ms of the newest reading, None before the first
+        # Hard IRQ so the timestamp is taken at the edge, not when the
+        # scheduler gets round to it; the handler does not allocate.
+        self.echo.irq(trigger=Pin.IRQ_RISING | Pin.IRQ_FALLING, handler=self._on_echo, hard=True)
+
+    def _push(self, cm):
+        self._buf[self._head] = cm
+        self._head = (self._head + 1) % len(self._buf)
+        self._stamp = ticks_ms()
+
+    def _on_echo(self, pin):
+        t = ticks_us()
+        if pin.value():
+            self._rise = t
+        elif self._busy:
+            self._busy = False
+            width = ticks_diff(t, self._rise)
+            cm = width * 343 // 20000
+            self._push(cm if width < self.timeout_us and cm <= MAX_RANGE_CM else NO_ECHO)
+
+    def trigger(self):
+        """Start a measurement; returns False if the last one is still running."""
+        now = ticks_us()
+        if self._busy:
+            if ticks_diff(now, self._fired) < self.timeout_us:
+                return False
+            self._busy = False
+            self._push(NO_ECHO)  # echo never came back
+        self._busy = True
+        self._fired = now
+        self.trig.on()
+        sleep_us(10)
+        self.trig.off()
+        return True
+
+    def age_ms(self):
+        """ms since the newest reading, None if there has been none yet."""
+        return None if self._stamp is None else ticks_diff(ticks_ms(), self._stamp)
+
+    def measure_cm(self):
+        """Blocking: refill the whole window with fresh pings, then the median.
+
+        For callers that have not pinged recently (the buffered readings
+        would be stale); takes up to about window * (timeout + CYCLE_MS).
+        """
+        for _ in range(len(self._buf)):
+            if not self.trigger():
+                sleep_us(self.timeout_us)  # previous ping still running
+                self.trigger()
+            t0 = ticks_us()
+            while self._busy and ticks_diff(ticks_us(), t0) < self.timeout_us:
+                pass
+            sleep_ms(CYCLE_MS)
+        return self.distance_cm()
+
+    def last_cm(self):
+        """Newest raw reading (unfiltered), None when it saw nothing."""
+        v = self._buf[(self._head - 1) % len(self._buf)]
+        return None if v == NO_ECHO else v
+
+    def distance_cm(self):
+        """Median of the buffered readings in whole cm, None when out of range."""
+        tmp = self._tmp
+        n = len(tmp)
+        for i in range(n):
+            v = self._buf[i]
+            j = i
+            while j > 0 and tmp[j - 1] > v:
+                tmp[j] = tmp[j - 1]
+                j -= 1
+            tmp[j] = v
+        m = tmp[n // 2]
+        return None if m == NO_ECHO else m
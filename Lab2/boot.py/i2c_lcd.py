@@ -11,6 +11,16 @@ class I2cLcd(LcdApi):
 
     SHIFT_DATA = 4
 
+    # Batched writes: a whole command or string goes out in one writeto.
+    # Each I2C byte takes 9 bit times, well above the HD44780's 450 ns
+    # enable pulse; only its 37 us execution time needs idle bytes between
+    # characters at fast bus speeds. Set BATCH = False for the old
+    # per-nibble writes.
+    BATCH = True
+    I2C_FREQ = 400000
+    EXEC_US = 37
+    _batch_buf = None
+
     # -----------------------------
     # Add move_to for cursor positioning
     # -----------------------------
@@ -65,13 +75,60 @@ class I2cLcd(LcdApi):
         self.hal_write_byte(0)
 
     def hal_write_command(self, cmd):
+        if self.BATCH:
+            self.hal_write_batch(cmd, 0)
+            return
         self.hal_write_byte((cmd & 0xF0) | self.MASK_RS*0)
         self.hal_write_byte(((cmd << 4) & 0xF0) | self.MASK_RS*0)
 
     def hal_write_data(self, data):
+        if self.BATCH:
+            self.hal_write_batch(data, self.MASK_RS)
+            return
         self.hal_write_byte((data & 0xF0) | self.MASK_RS)
         self.hal_write_byte(((data << 4) & 0xF0) | self.MASK_RS)
 
+    # -----------------------------
+    # Batched writes
+    # -----------------------------
+    def _batch_setup(self):
+        byte_us = (9 * 1000000 + self.I2C_FREQ - 1) // self.I2C_FREQ
+        self._pad = max(0, (self.EXEC_US + byte_us - 1) // byte_us - 1)
+        self._step = 4 + self._pad
+        self._batch_buf = bytearray(self._step * 40)  # one full row at most
+        self._batch_mv = memoryview(self._batch_buf)
+
+    def _pack(self, pos, data, rs):
+        buf = self._batch_buf
+        high = (data & 0xF0) | rs | self.backlight
+        low = ((data << 4) & 0xF0) | rs | self.backlight
+        buf[pos] = high | self.MASK_E
+        buf[pos + 1] = high
+        buf[pos + 2] = low | self.MASK_E
+        buf[pos + 3] = low
+        for i in range(self._pad):
+            buf[pos + 4 + i] = low
+        return pos + self._step
+
+    def hal_write_batch(self, data, rs):
+        if self._batch_buf is None:
+            self._batch_setup()
+        pos = self._pack(0, data, rs)
+        self.i2c.writeto(self.i2c_addr, self._batch_mv[:pos])
+
+    def putstr(self, string):
+        if not self.BATCH or '\n' in string:
+            LcdApi.putstr(self, string)
+            return
+        if self._batch_buf is None:
+            self._batch_setup()
+        cap = len(self._batch_buf) // self._step
+        for start in range(0, len(string), cap):
+            pos = 0
+            for char in string[start:start + cap]:
+                pos = self._pack(pos, ord(char), self.MASK_RS)
+            self.i2c.writeto(self.i2c_addr, self._batch_mv[:pos])
+
     def hal_write_byte(self, byte):
         self.i2c.writeto(self.i2c_addr, bytes([byte | self.backlight | self.MASK_E]))
         time.sleep_us(1)
@@ -60,4 +60,62 @@ class LcdApi:
         self.hal_write_command(self.LCD_DDRAM | 0x40)
 
     def hal_backlight_on(self): pass
-    def hal_backlight_off(self): pass
\ No newline at end of file
+    def hal_backlight_off(self): pass
+
+
+class LcdFrame:
+    """Shadow framebuffer over an LcdApi display.
+
+    Keeps a copy of what is on the glass and only sends the characters that
+    differ, one move_to per changed run. An unchanged frame sends nothing.
+    Anything else that writes to the display must call invalidate().
+    """
+
+    def __init__(self, lcd, num_lines=None, num_columns=None):
+        self.lcd = lcd
+        self.num_lines = num_lines or lcd.num_lines
+        self.num_columns = num_columns or lcd.num_columns
+        self.invalidate()
+
+    def invalidate(self):
+        """Clear the display and start again from a blank shadow."""
+        self.lcd.clear()
+        self._shadow = [" " * self.num_columns] * self.num_lines
+        self._col, self._row = 0, 0  # where the LCD cursor is now
+
+    def write(self, row, text):
+        """Show text on row (cut / padded to the width); returns chars sent."""
+        w = self.num_columns
+        text = text[:w]
+        if len(text) < w:
+            text += " " * (w - len(text))
+        old = self._shadow[row]
+        if text == old:
+            return 0
+        sent = 0
+        i = 0
+        while i < w:
+            if text[i] == old[i]:
+                i += 1
+                continue
+            start = i
+            end = i + 1
+            # Extend the run over gaps of one unchanged char: resending it
+            # costs the same as the move_to it saves
+            while end < w and (text[end] != old[end] or (end + 1 < w and text[end + 1] != old[end + 1])):
+                end += 1
+            if (self._col, self._row) != (start, row):
+                self.lcd.move_to(start, row)
+            self.lcd.putstr(text[start:end])
+            self._col, self._row = end, row
+            sent += end - start
+            i = end
+        self._shadow[row] = text
+        return sent
+
+    def show(self, *lines):
+        """Show one string per row; rows not given are blanked."""
+        sent = 0
+        for row in range(self.num_lines):
+            sent += self.write(row, lines[row] if row < len(lines) else "")
+        return sent
@@ -2,11 +2,25 @@ try:
     import usocket as socket
 except:
     import socket
-import network, time, gc, machine
-from machine import Pin, I2C
+try:
+    import uselect as select
+except:
+    import select
+try:
+    import ure as re
+except:
+    import re
+try:
+    import uerrno as errno
+except:
+    import errno
+import network, time, gc, micropython
+from machine import Pin, I2C, Timer
 import dht
-from lcd_api import LcdApi
+from binascii import crc32
+from lcd_api import LcdFrame
 from i2c_lcd import I2cLcd
+from hcsr04 import HCSR04
 
 gc.collect()
 
@@ -22,17 +36,23 @@ ECHO_PIN  = 26     # D26
 I2C_SDA   = 21     # D21
 I2C_SCL   = 22     # D22
 
+# ---------- SAMPLING ----------
+SAMPLE_PERIOD_MS = 100   # sampler tick, one sonar ping per tick
+DHT_INTERVAL_MS  = 2000  # DHT22 needs 2 s between measurements
+SAMPLE_TIMER_ID  = 0
+SONAR_STALE_MS   = 1000  # older buffered pings are re-measured before use
+
 # ---------- HW INIT ----------
 led = Pin(LED_PIN, Pin.OUT)
 dht_sensor = dht.DHT22(Pin(DHT_PIN))
-trig = Pin(TRIG_PIN, Pin.OUT)
-echo = Pin(ECHO_PIN, Pin.IN)
+sonar = HCSR04(TRIG_PIN, ECHO_PIN)
 
 # LCD init
 i2c = I2C(0, scl=Pin(I2C_SCL), sda=Pin(I2C_SDA), freq=400000)
 addrs = i2c.scan()
 lcd_addr = addrs[0] if addrs else 0x27
 lcd = I2cLcd(i2c, lcd_addr, 2, 16)
+frame = LcdFrame(lcd, 2, 16)  # only changed characters are sent
 
 # ---------- WIFI ----------
 def connect_wifi(ssid, password, timeout=15):
@@ -54,60 +74,91 @@ def connect_wifi(ssid, password, timeout=15):
 ip = connect_wifi(SSID, PASSWORD)
 
 # ---------- SENSOR HELPERS ----------
-def read_dht(retries=3):
-    for _ in range(retries):
-        try:
-            dht_sensor.measure()
-            t = dht_sensor.temperature()
-            h = dht_sensor.humidity()
-            if t is None or h is None:
-                raise Exception("DHT returned None")
-            return t, h
-        except:
-            time.sleep(1)
-    return None, None
-
-def read_distance(timeout_us=30000):
-    trig.value(0)
-    time.sleep_us(2)
-    trig.value(1)
-    time.sleep_us(10)
-    trig.value(0)
+def read_dht():
+    # One attempt only: the sampler tries again on its next DHT interval
+    # instead of sleeping here.
     try:
-        pulse = machine.time_pulse_us(echo, 1, timeout_us)
-        if pulse <= 0:
-            return None
-        return pulse / 58.0  # µs → cm
-    except:
-        return None
+        dht_sensor.measure()
+        t = dht_sensor.temperature()
+        h = dht_sensor.humidity()
+        if t is None or h is None:
+            return None, None
+        return t, h
+    except OSError:
+        return None, None
+
+def read_distance():
+    # Median of the previous pings; the echo of the one started here is
+    # timed by the driver's IRQ and counted on the next call. If there
+    # has been no ping lately (boot, or a caller that only reads now and
+    # then) those would be stale, so measure synchronously instead.
+    age = sonar.age_ms()
+    if age is None or age > SONAR_STALE_MS:
+        d = sonar.measure_cm()
+    else:
+        d = sonar.distance_cm()
+    sonar.trigger()
+    return d
+
+# ---------- SENSOR SAMPLER ----------
+# A timer schedules _sample every SAMPLE_PERIOD_MS; requests only read the
+# snapshot, so serving a page never waits on a sensor. *_ms are the
+# ticks_ms() of the last good reading (None until there is one).
+snapshot = {"temp": None, "hum": None, "dht_ms": None,
+            "dist": None, "dist_ms": None}
+_next_dht = time.ticks_ms()
+
+def _sample(_):
+    global _next_dht
+    now = time.ticks_ms()
+    snapshot["dist"] = read_distance()
+    snapshot["dist_ms"] = now
+    if time.ticks_diff(now, _next_dht) >= 0:
+        _next_dht = time.ticks_add(now, DHT_INTERVAL_MS)
+        t, h = read_dht()
+        if t is not None:
+            snapshot["temp"], snapshot["hum"], snapshot["dht_ms"] = t, h, now
+
+def _sample_tick(_):
+    try:
+        micropython.schedule(_sample, None)
+    except RuntimeError:
+        pass  # queue full, the next tick samples
+
+def sample_age_ms(key="dht_ms"):
+    """Age of the newest reading in ms, None if there has been none yet."""
+    t = snapshot[key]
+    return None if t is None else time.ticks_diff(time.ticks_ms(), t)
+
+sampler = Timer(SAMPLE_TIMER_ID)
+sampler.init(mode=Timer.PERIODIC, period=SAMPLE_PERIOD_MS, callback=_sample_tick)
 
 # ---------- LCD DISPLAY ----------
 def lcd_display(dist=None, temp=None):
-    lcd.clear()
-    lcd.move_to(0, 0)
     if dist is not None:
-        lcd.putstr("Dist:{:.1f}cm".format(dist))
+        line1 = "Dist:{:.1f}cm".format(dist)
     else:
-        lcd.putstr("Dist:N/A")
-    lcd.move_to(0, 1)
+        line1 = "Dist:N/A"
     if temp is not None:
-        lcd.putstr("Temp:{:.1f}C".format(temp))
+        line2 = "Temp:{:.1f}C".format(temp)
     else:
-        lcd.putstr("Temp:N/A")
+        line2 = "Temp:N/A"
+    frame.show(line1, line2)
 # ---------- HTML ----------
-def webpage(temp, hum, dist, led_state):
-    t_str = f"{temp:.1f}" if temp is not None else "N/A"
-    h_str = f"{hum:.1f}" if hum is not None else "N/A"
-    d_str = f"{dist:.1f}" if dist is not None else "N/A"
-    return f"""<!DOCTYPE html>
+# The page is static: it loads once (cacheable, ETag) and its script
+# fetches the readings from /api/state, while LED / LCD actions are small
+# POSTs answered with the same JSON. The page is ASCII only (emoji as HTML
+# entities) so a frozen build keeps it in flash. Responses are built in
+# preallocated buffers: the header is written just in front of the body
+# and both go out in one send of a memoryview slice.
+_PAGE = b"""<!DOCTYPE html>
 <html lang="en">
 <head>
   <meta charset="utf-8">
   <title>ESP32 IoT Webserver</title>
   <meta name="viewport" content="width=device-width, initial-scale=1.0">
-  <meta http-equiv="refresh" content="10">
   <style>
-    body {{
+    body {
       font-family: Arial, sans-serif;
       background: #f4f7fb;
       margin: 0;
@@ -115,8 +166,8 @@ def webpage(temp, hum, dist, led_state):
       display: flex;
       flex-direction: column;
       align-items: center;
-    }}
-    header {{
+    }
+    header {
       background: #0066cc;
       color: white;
       width: 100%;
@@ -125,29 +176,29 @@ def webpage(temp, hum, dist, led_state):
       font-size: 1.5em;
       font-weight: bold;
       box-shadow: 0 2px 8px rgba(0,0,0,0.15);
-    }}
-    .container {{
+    }
+    .container {
       width: 95%;
       max-width: 700px;
       margin: 20px auto;
-    }}
-    .card {{
+    }
+    .card {
       background: #fff;
       padding: 20px;
       margin: 15px 0;
       border-radius: 12px;
       box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-    }}
-    .card h2 {{
+    }
+    .card h2 {
       margin-top: 0;
       color: #222;
-    }}
-    .card p {{
+    }
+    .card p {
       font-size: 1.1em;
       margin: 8px 0;
       color: #333;
-    }}
-    .btn {{
+    }
+    .btn {
       display: inline-block;
       padding: 12px 20px;
       margin: 6px 5px;
@@ -156,20 +207,22 @@ def webpage(temp, hum, dist, led_state):
       color: white;
       font-size: 1em;
       text-decoration: none;
+      border: none;
+      cursor: pointer;
       transition: 0.3s;
-    }}
-    .btn:hover {{
+    }
+    .btn:hover {
       background: #005fa3;
-    }}
-    form input[type=text] {{
+    }
+    form input[type=text] {
       padding: 10px;
       width: 80%;
       max-width: 300px;
       margin: 10px 0;
       border: 1px solid #ccc;
       border-radius: 6px;
-    }}
-    form input[type=submit] {{
+    }
+    form input[type=submit] {
       padding: 10px 20px;
       background: #28a745;
       border: none;
@@ -178,125 +231,533 @@ def webpage(temp, hum, dist, led_state):
       font-size: 1em;
       cursor: pointer;
       transition: 0.3s;
-    }}
-    form input[type=submit]:hover {{
+    }
+    form input[type=submit]:hover {
       background: #1f7a33;
-    }}
-    footer {{
+    }
+    footer {
       margin: 15px 0;
       font-size: 0.85em;
       color: #666;
-    }}
+    }
   </style>
 </head>
 <body>
-  <header>🌐 ESP32 IoT Webserver</header>
+  <header>&#x1F310; ESP32 IoT Webserver</header>
   <div class="container">
 
     <div class="card">
-      <h2>💡 LED Control</h2>
-      <p>Status: <b>{led_state}</b></p>
-      <a href="/led_on" class="btn">Turn ON</a>
-      <a href="/led_off" class="btn">Turn OFF</a>
+      <h2>&#x1F4A1; LED Control</h2>
+      <p>Status: <b id="led">...</b></p>
+      <button class="btn" onclick="act('/api/led','state=on')">Turn ON</button>
+      <button class="btn" onclick="act('/api/led','state=off')">Turn OFF</button>
     </div>
 
     <div class="card">
-      <h2>📊 Sensor Readings</h2>
-      <p>🌡 Temperature: <b>{t_str}&deg;C</b></p>
-      <p>💧 Humidity: <b>{h_str}%</b></p>
-      <p>📏 Distance: <b>{d_str} cm</b></p>
+      <h2>&#x1F4CA; Sensor Readings</h2>
+      <p>&#x1F321; Temperature: <b id="temp">...</b></p>
+      <p>&#x1F4A7; Humidity: <b id="hum">...</b></p>
+      <p>&#x1F4CF; Distance: <b id="dist">...</b></p>
+      <p>&#x23F1; Sample age: <b id="age">...</b></p>
     </div>
 
     <div class="card">
-      <h2>🖥 LCD Controls</h2>
-      <a href="/show_dist" class="btn">Show Distance</a>
-      <a href="/show_temp" class="btn">Show Temp</a>
-      <a href="/show_both" class="btn">Show Both</a>
+      <h2>&#x1F5A5; LCD Controls</h2>
+      <button class="btn" onclick="act('/api/lcd','show=dist')">Show Distance</button>
+      <button class="btn" onclick="act('/api/lcd','show=temp')">Show Temp</button>
+      <button class="btn" onclick="act('/api/lcd','show=both')">Show Both</button>
     </div>
 
     <div class="card">
-      <h2>✍️ Custom LCD Message</h2>
-      <form action="/send_text">
+      <h2>&#x270D;&#xFE0F; Custom LCD Message</h2>
+      <form action="/send_text" onsubmit="return act('/api/lcd','msg='+encodeURIComponent(this.msg.value))">
         <input type="text" name="msg" placeholder="Enter text for LCD">
         <br>
         <input type="submit" value="Send">
       </form>
     </div>
 
-    <footer>🔄 Page auto-refreshes every 10s</footer>
+    <footer>&#x1F504; Readings update every 10s</footer>
   </div>
+<script>
+function $(i){return document.getElementById(i);}
+function f(v,u){return v===null?'N/A':v.toFixed(1)+u;}
+function show(s){
+  $('led').textContent=s.led?'ON':'OFF';
+  $('temp').innerHTML=f(s.temp,'&deg;C');
+  $('hum').textContent=f(s.hum,'%');
+  $('dist').textContent=f(s.dist,' cm');
+  $('age').textContent=s.age_ms===null?'N/A':(s.age_ms/1000).toFixed(1)+' s';
+}
+function poll(){fetch('/api/state').then(function(r){return r.json();}).then(show).catch(function(){});}
+function act(u,b){
+  fetch(u,{method:'POST',headers:{'Content-Type':'application/x-www-form-urlencoded'},body:b})
+    .then(function(r){return r.json();}).then(show).catch(function(){});
+  return false;
+}
+poll();
+setInterval(poll,10000);
+</script>
 </body>
 </html>
 """
+_PAGE_ETAG = ('"p%08x"' % (crc32(_PAGE) & 0xFFFFFFFF)).encode()
+_CT_HTML = b"text/html; charset=utf-8"
+_CT_JSON = b"application/json"
+_PAGE_EXTRA = b"Cache-Control: max-age=86400\r\nETag: " + _PAGE_ETAG + b"\r\n"
+_HEAD_CLOSE = b"\r\nConnection: close\r\n\r\n"
+_HEAD_KEEP = b"\r\nConnection: keep-alive\r\n\r\n"
+_NOT_MODIFIED = (b"HTTP/1.1 304 Not Modified\r\nETag: " + _PAGE_ETAG + b"\r\nConnection: close\r\n\r\n",
+                 b"HTTP/1.1 304 Not Modified\r\nETag: " + _PAGE_ETAG + b"\r\nConnection: keep-alive\r\n\r\n")
+_NULL = b"null"
+
+_head_buf = bytearray(256)
+_head_mv = memoryview(_head_buf)
+_BODY_AT = len(_head_buf)  # room left for the header in front of every body
+_page_buf = bytearray(_BODY_AT + len(_PAGE))
+_page_mv = memoryview(_page_buf)
+_page_mv[_BODY_AT:] = _PAGE  # filled once, only the header changes per request
+_state_buf = bytearray(_BODY_AT + 128)
+_state_mv = memoryview(_state_buf)
+
+def _put(mv, pos, data):
+    n = len(data)
+    mv[pos:pos + n] = data
+    return pos + n
+
+def _put_int(buf, pos, v):
+    if v < 0:
+        buf[pos] = 45  # '-'
+        pos += 1
+        v = -v
+    start = pos
+    while True:
+        buf[pos] = 48 + v % 10
+        pos += 1
+        v //= 10
+        if not v:
+            break
+    # digits went in backwards
+    i, j = start, pos - 1
+    while i < j:
+        buf[i], buf[j] = buf[j], buf[i]
+        i += 1
+        j -= 1
+    return pos
+
+def _put_tenths(buf, pos, tenths):
+    """Write tenths / 10 with one decimal, e.g. 253 -> "25.3"."""
+    if tenths < 0:
+        buf[pos] = 45
+        pos += 1
+        tenths = -tenths
+    pos = _put_int(buf, pos, tenths // 10)
+    buf[pos] = 46  # '.'
+    buf[pos + 1] = 48 + tenths % 10
+    return pos + 2
+
+def _put_value(buf, mv, pos, x):
+    if x is None:
+        return _put(mv, pos, _NULL)
+    return _put_tenths(buf, pos, int(x * 10 + (0.5 if x >= 0 else -0.5)))
+
+def render_state():
+    """Write the snapshot as JSON into _state_buf from _BODY_AT on, returns where it ends."""
+    buf, mv = _state_buf, _state_mv
+    pos = _put(mv, _BODY_AT, b'{"temp":')
+    pos = _put_value(buf, mv, pos, snapshot["temp"])
+    pos = _put(mv, pos, b',"hum":')
+    pos = _put_value(buf, mv, pos, snapshot["hum"])
+    pos = _put(mv, pos, b',"dist":')
+    pos = _put_value(buf, mv, pos, snapshot["dist"])
+    pos = _put(mv, pos, b',"led":')
+    pos = _put(mv, pos, b"true" if led.value() else b"false")
+    pos = _put(mv, pos, b',"age_ms":')
+    age = sample_age_ms()
+    pos = _put(mv, pos, _NULL) if age is None else _put_int(buf, pos, age)
+    return _put(mv, pos, b"}")
+
+def _send_all(conn, mv):
+    """Send what the socket takes right now; the rest is copied to the
+    client's out queue and written on POLLOUT (see write_client)."""
+    c = clients[conn]
+    pos = 0
+    n = len(mv)
+    if not c.out:
+        while pos < n:
+            try:
+                sent = conn.send(mv[pos:])
+            except OSError as e:
+                if e.args[0] != errno.EAGAIN:
+                    raise
+                break
+            if not sent:
+                break
+            pos += sent
+    if pos < n:
+        c.out = c.out[c.out_pos:] + bytes(mv[pos:])  # only slow clients pay for this copy
+        c.out_pos = 0
+
+def send_response(conn, mv, end, ctype, keep, extra=b""):
+    """Send the body mv[_BODY_AT:end] with a 200 header written in front of it."""
+    buf, hm = _head_buf, _head_mv
+    pos = _put(hm, 0, b"HTTP/1.1 200 OK\r\nContent-Type: ")
+    pos = _put(hm, pos, ctype)
+    pos = _put(hm, pos, b"\r\n")
+    pos = _put(hm, pos, extra)
+    pos = _put(hm, pos, b"Content-Length: ")
+    pos = _put_int(buf, pos, end - _BODY_AT)
+    pos = _put(hm, pos, _HEAD_KEEP if keep else _HEAD_CLOSE)
+    start = _BODY_AT - pos
+    mv[start:_BODY_AT] = hm[:pos]
+    _send_all(conn, mv[start:end])
+
+def send_page(conn, request, keep=False):
+    if header_value(request, "if-none-match") == _PAGE_ETAG.decode():
+        _send_all(conn, _NOT_MODIFIED[keep])
+        return
+    send_response(conn, _page_mv, len(_page_buf), _CT_HTML, keep, _PAGE_EXTRA)
+
+def send_state(conn, keep=False):
+    send_response(conn, _state_mv, render_state(), _CT_JSON, keep)
 
 # ---------- SERVER ----------
+# One poll() loop multiplexes the listening socket and every client, so a
+# client that connects and never sends (or a half-open phone connection)
+# only holds its own slot until its deadline, and a newcomer to a full
+# server takes the slot of the longest-waiting connection with nothing in
+# flight. Requests are read
+# incrementally until the blank line, and HTTP/1.1 connections are kept
+# open for further requests. Writes never block either: what a client does
+# not take at once waits in its out queue, and the whole response must be
+# delivered within WRITE_TIMEOUT_MS.
+MAX_CLIENTS = 8
+REQUEST_MAX = 2048          # longer request heads get a 431 and are closed
+BODY_MAX = 512              # POST bodies (form fields) larger than this get a 413
+REQUEST_TIMEOUT_MS = 3000   # a started request must be complete within this
+IDLE_TIMEOUT_MS = 10000     # idle keep-alive connections are closed after this
+KEEPALIVE_MAX = 50          # requests per connection before it is closed
+WRITE_TIMEOUT_MS = 3000     # a response must be fully sent within this
+POLL_MS = 200
+
 addr = socket.getaddrinfo('0.0.0.0', 80)[0][-1]
 s = socket.socket()
 s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
 s.bind(addr)
-s.listen(1)
+s.listen(MAX_CLIENTS)
+s.setblocking(False)
 print("Listening on", addr)
 
+poller = select.poll()
+poller.register(s, select.POLLIN)
+clients = {}  # socket -> Client
+
+class Client:
+    def __init__(self, now):
+        self.buf = b""
+        self.head_end = -1  # where the blank line of the current request is, -1 until seen
+        self.scanned = 0    # buf before this has no blank line in it
+        self.deadline = time.ticks_add(now, REQUEST_TIMEOUT_MS)  # no idle grace before the first request
+        self.since = now    # when it started waiting for a request
+        self.served = 0
+        self.out = b""      # response bytes the socket did not take yet
+        self.out_pos = 0
+        self.close_after = False
+
+_PCT = re.compile(r'%([0-9A-Fa-f]{2})')  # compiled once, not per call
+
+def _pct_char(m):
+    return chr(int(m.group(1), 16))
+
 def urldecode(s):
-    import ure
     s = s.replace('+', ' ')
-    hex_pattern = ure.compile(r'%([0-9A-Fa-f]{2})')
-    return hex_pattern.sub(lambda m: chr(int(m.group(1), 16)), s)
+    if '%' not in s:
+        return s
+    return _PCT.sub(_pct_char, s)
 
-while True:
-    try:
-        conn, addr = s.accept()
-        request = conn.recv(2048).decode('utf-8', 'ignore')
+def header_value(request, name):
+    """Value of header `name` (lowercase) in the request head, None if absent."""
+    lower = request.lower()
+    i = lower.find("\r\n" + name + ":")
+    if i < 0:
+        return None
+    i += len(name) + 3
+    j = request.find("\r\n", i)
+    return request[i:j if j >= 0 else len(request)].strip()
 
-        # LED control
-        if '/led_on' in request:
-            led.value(1)
-        elif '/led_off' in request:
-            led.value(0)
+def parse_form(text, params):
+    """Add the fields of a query string / form body to params."""
+    for pair in text.split('&'):
+        if pair:
+            k, _, v = pair.partition('=')
+            params[urldecode(k)] = urldecode(v)
+    return params
 
-        # Read sensors
-        t, h = read_dht()
-        d = read_distance()
-        led_state = "ON" if led.value() else "OFF"
-        # LCD actions
-        if '/show_dist' in request:
-            lcd_display(dist=d, temp=None)
-        elif '/show_temp' in request:
-            lcd_display(dist=None, temp=t)
-        elif '/show_both' in request:
-            lcd_display(dist=d, temp=t)
-
-        # Custom LCD text
-        if '/send_text' in request:
-            try:
-                line = request.split('\n')[0]
-                path = line.split(' ')[1]
-                if '?' in path:
-                    qs = path.split('?', 1)[1]
-                    if 'msg=' in qs:
-                        val = qs.split('msg=', 1)[1].split('&')[0]
-                        val = urldecode(val)
-                        lcd.clear()
-                        if len(val) <= 16:
-                            lcd.putstr(val)
-                        else:
-                            lcd.putstr(val[:16])
-                            lcd.move_to(0, 1)
-                            lcd.putstr(val[16:32])
-            except Exception as e:
-                print("Custom text error:", e)
-
-        # Send webpage
-        response = webpage(t, h, d, led_state)
-        header = "HTTP/1.1 200 OK\r\nContent-Type: text/html; charset=utf-8\r\nConnection: close\r\n\r\n"
-        conn.send(header.encode('utf-8'))
-        conn.send(response.encode('utf-8'))
+def lcd_show_text(val):
+    frame.show(val[:16], val[16:32])
+
+# ---------- ROUTES ----------
+# (method, path) -> (handler, names of the parameters it takes). The request
+# line is split once and the query string / form body parsed once; the
+# handler is called as handler(conn, request, keep, **params) with only the
+# parameters it declared (None when the client did not send one).
+ROUTES = {}
+_PATHS = set()  # every routed path, to tell 405 from 404
+
+def route(method, path, params=()):
+    def register(handler):
+        ROUTES[(method, path)] = (handler, params)
+        _PATHS.add(path)
+        return handler
+    return register
+
+def lcd_action(show):
+    t, d = snapshot["temp"], snapshot["dist"]
+    if show == 'dist':
+        lcd_display(dist=d, temp=None)
+    elif show == 'temp':
+        lcd_display(dist=None, temp=t)
+    elif show == 'both':
+        lcd_display(dist=d, temp=t)
+
+@route('GET', '/')
+def page(conn, request, keep):
+    send_page(conn, request, keep)
+
+@route('GET', '/api/state')
+def api_state(conn, request, keep):
+    send_state(conn, keep)
+
+@route('POST', '/api/led', ('state',))
+def api_led(conn, request, keep, state):
+    if state in ('on', 'off'):
+        led.value(1 if state == 'on' else 0)
+    send_state(conn, keep)
+
+@route('POST', '/api/lcd', ('show', 'msg'))
+def api_lcd(conn, request, keep, show, msg):
+    lcd_action(show)
+    if msg is not None:
+        lcd_show_text(msg)
+    send_state(conn, keep)
+
+# Plain links, for browsers without JavaScript: act, then show the page
+@route('GET', '/led_on')
+def led_on(conn, request, keep):
+    led.value(1)
+    send_page(conn, request, keep)
+
+@route('GET', '/led_off')
+def led_off(conn, request, keep):
+    led.value(0)
+    send_page(conn, request, keep)
+
+@route('GET', '/show_dist')
+def show_dist(conn, request, keep):
+    lcd_action('dist')
+    send_page(conn, request, keep)
+
+@route('GET', '/show_temp')
+def show_temp(conn, request, keep):
+    lcd_action('temp')
+    send_page(conn, request, keep)
+
+@route('GET', '/show_both')
+def show_both(conn, request, keep):
+    lcd_action('both')
+    send_page(conn, request, keep)
+
+@route('GET', '/send_text', ('msg',))
+def send_text(conn, request, keep, msg):
+    if msg is not None:
+        lcd_show_text(msg)
+    send_page(conn, request, keep)
+
+def handle_request(conn, request, body, keep):
+    line = request.partition('\r\n')[0].split(' ')
+    if len(line) < 2:
+        send_error(conn, b"400 Bad Request", keep)
+        return
+    method = line[0]
+    path, _, query = line[1].partition('?')
+    entry = ROUTES.get((method, path))
+    if entry is None:
+        send_error(conn, b"405 Method Not Allowed" if path in _PATHS else b"404 Not Found", keep)
+        return
+    handler, names = entry
+    kwargs = {}
+    if names:
+        params = parse_form(query, {})
+        if body:
+            parse_form(body, params)
+        for name in names:
+            kwargs[name] = params.get(name)
+    handler(conn, request, keep, **kwargs)
+
+def send_error(conn, status, keep=False):
+    _send_all(conn, b"HTTP/1.1 " + status + b"\r\nContent-Length: 0" + (_HEAD_KEEP if keep else _HEAD_CLOSE))
+
+def close_client(conn):
+    try:
+        poller.unregister(conn)
+    except Exception:
+        pass
+    try:
         conn.close()
+    except Exception:
+        pass
+    clients.pop(conn, None)
+
+def wants_keepalive(head):
+    line_end = head.find(b"\r\n")
+    if line_end < 0:
+        line_end = len(head)  # no headers: the whole head is the request line
+    lower = head[line_end:].lower()
+    if head[:line_end].endswith(b"HTTP/1.1"):
+        return b"\r\nconnection: close" not in lower
+    return b"\r\nconnection: keep-alive" in lower
 
-    except Exception as e:
-        print("Server error:", e)
+def evict_waiting(now):
+    """Close the connection that has waited longest without a request in
+    progress; False if every client is busy."""
+    victim = None
+    for conn, c in clients.items():
+        if c.buf or c.out:
+            continue
+        if victim is None or time.ticks_diff(c.since, clients[victim].since) < 0:
+            victim = conn
+    if victim is None:
+        return False
+    close_client(victim)
+    return True
+
+def accept_client(now):
+    try:
+        conn, _ = s.accept()
+    except OSError:
+        return
+    if len(clients) >= MAX_CLIENTS and not evict_waiting(now):
+        conn.close()  # full of requests in progress: drop the newcomer
+        return
+    conn.setblocking(False)
+    poller.register(conn, select.POLLIN)
+    clients[conn] = Client(now)
+
+def read_client(conn, now):
+    c = clients[conn]
+    try:
+        data = conn.recv(512)
+    except OSError:
+        return  # spurious wake-up, nothing to read yet
+    if not data:
+        close_client(conn)
+        return
+    if not c.buf and c.served:
+        c.deadline = time.ticks_add(now, REQUEST_TIMEOUT_MS)  # a request has started
+    c.buf += data
+    process_requests(conn, c, now)
+
+def finish_response(conn, c, keep, now):
+    """After a response: wait for the rest of it to drain, or go on with
+    the connection. Returns False once nothing more should be read."""
+    if c.out:
+        c.close_after = not keep
+        c.deadline = time.ticks_add(now, WRITE_TIMEOUT_MS)
+        poller.modify(conn, select.POLLOUT)  # stop reading until it is out
+        return False
+    if not keep:
+        close_client(conn)
+        return False
+    c.deadline = time.ticks_add(now, REQUEST_TIMEOUT_MS if c.buf else IDLE_TIMEOUT_MS)
+    c.since = now
+    return True
+
+def process_requests(conn, c, now):
+    while True:
+        end = c.head_end
+        if end < 0:
+            end = c.buf.find(b"\r\n\r\n", max(0, c.scanned - 3))  # only look at what is new
+            if end < 0:
+                c.scanned = len(c.buf)
+                if len(c.buf) > REQUEST_MAX:
+                    send_error(conn, b"431 Request Header Fields Too Large")
+                    finish_response(conn, c, False, now)
+                return
+            c.head_end = end
+        head = c.buf[:end]
+        request = head.decode('utf-8', 'ignore')
+        try:
+            length = int(header_value(request, "content-length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            send_error(conn, b"400 Bad Request")  # malformed Content-Length
+            finish_response(conn, c, False, now)
+            return
+        if length > BODY_MAX:
+            send_error(conn, b"413 Payload Too Large")
+            finish_response(conn, c, False, now)
+            return
+        if len(c.buf) < end + 4 + length:
+            return  # body still on its way
+        body = c.buf[end + 4:end + 4 + length].decode('utf-8', 'ignore')
+        c.buf = c.buf[end + 4 + length:]  # anything after it is the next request
+        c.head_end = -1
+        c.scanned = 0
+        c.served += 1
+        keep = wants_keepalive(head) and c.served < KEEPALIVE_MAX
+        handle_request(conn, request, body, keep)
+        if not finish_response(conn, c, keep, now):
+            return
+
+def write_client(conn, now):
+    c = clients[conn]
+    try:
+        sent = conn.send(memoryview(c.out)[c.out_pos:])
+    except OSError as e:
+        if e.args[0] != errno.EAGAIN:
+            raise
+        return
+    c.out_pos += sent
+    if c.out_pos < len(c.out):
+        return  # more next time, still under the same deadline
+    c.out = b""
+    c.out_pos = 0
+    if c.close_after:
+        close_client(conn)
+        return
+    poller.modify(conn, select.POLLIN)
+    c.deadline = time.ticks_add(now, REQUEST_TIMEOUT_MS if c.buf else IDLE_TIMEOUT_MS)
+    c.since = now
+    process_requests(conn, c, now)  # pipelined requests that arrived meanwhile
+
+def expire_clients(now):
+    for conn in [k for k in clients if time.ticks_diff(now, clients[k].deadline) >= 0]:
+        close_client(conn)
+
+def serve_forever():
+    while True:
         try:
-            conn.close()
-        except:
-            pass
-        time.sleep(0.1)
\ No newline at end of file
+            events = poller.poll(POLL_MS)
+            now = time.ticks_ms()
+            for obj, ev in events:
+                if obj is s:
+                    accept_client(now)
+                elif obj in clients:
+                    if ev & (select.POLLHUP | select.POLLERR):
+                        close_client(obj)
+                    else:
+                        try:
+                            if ev & select.POLLOUT:
+                                write_client(obj, now)
+                            else:
+                                read_client(obj, now)
+                        except Exception as e:
+                            print("Client error:", e)
+                            close_client(obj)
+            expire_clients(now)
+        except Exception as e:
+            print("Server error:", e)
+            time.sleep(0.1)
+
+serve_forever()